@@ -6,23 +6,21 @@ import asyncio
 import json
 import os
 import re
-import threading
 from datetime import datetime, timedelta
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
 from flask_cors import CORS
 from functools import wraps
-from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
 from telethon.errors.rpcerrorlist import AuthRestartError
-from config import API_ID, API_HASH, SEARCH_BOT_USERNAME, STREAMING_BOT_USERNAME
-import nest_asyncio
+from config import (
+    API_ID, API_HASH, SEARCH_BOT_USERNAME, STREAMING_BOT_USERNAME,
+    TELEGRAM_SESSION_CONCURRENCY, TELEGRAM_SESSION_QUEUE_LIMIT, TELEGRAM_QUEUE_TIMEOUT
+)
+from telegram_pool import TelegramClientPool, PoolBusyError
 import tempfile
 import os as _os
 from typing import Optional
 
-# Apply nest_asyncio globally
-nest_asyncio.apply()
-
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 CORS(app)
@@ -32,14 +30,24 @@ SESSION_VALIDITY_HOURS = 24
 ADMIN_CREDENTIALS_FILE = "admin_credentials.json"
 PENDING_LOGINS = {}
 
-# Thread lock for Telegram operations
-telegram_lock = threading.Lock()
-
 # Telegram client
 api_id = int(API_ID)
 api_hash = API_HASH
 bot_username = SEARCH_BOT_USERNAME
 
+# Long-lived clients shared by all requests (one background event loop).
+# Sessions run independently; operations on one session are bounded by its gate.
+client_pool = TelegramClientPool(
+    api_id,
+    api_hash,
+    max_concurrency=TELEGRAM_SESSION_CONCURRENCY,
+    max_queue=TELEGRAM_SESSION_QUEUE_LIMIT,
+    queue_timeout=TELEGRAM_QUEUE_TIMEOUT
+)
+
+def session_name_for(phone):
+    return f"admin_{phone.replace('+', '').replace(' ', '')}"
+
 def save_admin_credentials(admin_name, phone):
     credentials = {
         "admin_name": admin_name,
@@ -119,47 +127,34 @@ def send_otp():
         else:
             phone_number = '+91' + phone_number
     
-    session_name = f"admin_{phone_number.replace('+', '').replace(' ', '')}"
+    session_name = session_name_for(phone_number)
     
-    async def send_code():
-        client = TelegramClient(session_name, api_id, api_hash)
-        try:
-            # Ensure connection established
-            for _ in range(3):
-                await client.connect()
-                if client.is_connected():
-                    break
-                await asyncio.sleep(0.5)
-
-            # Retry sending code on transient Telegram errors
-            last_err = None
-            for _ in range(3):
+    async def send_code(client):
+        # Retry sending code on transient Telegram errors
+        last_err = None
+        for _ in range(3):
+            try:
+                result = await client.send_code_request(phone_number)
+                phone_code_hash = result.phone_code_hash
+                return phone_code_hash
+            except (ConnectionError, AuthRestartError) as e:  # type: ignore[misc]
+                last_err = e
+                # Reconnect and retry
                 try:
-                    result = await client.send_code_request(phone_number)
-                    phone_code_hash = result.phone_code_hash
-                    return phone_code_hash
-                except (ConnectionError, AuthRestartError) as e:  # type: ignore[misc]
-                    last_err = e
-                    # Reconnect and retry
-                    try:
-                        if client.is_connected():
-                            await client.disconnect()
-                    except Exception:
-                        pass
-                    await asyncio.sleep(1.0)
-                    await client.connect()
-                except Exception as e:
-                    last_err = e
-                    break
-            if last_err:
-                raise last_err
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+                    if client.is_connected():
+                        await client.disconnect()
+                except Exception:
+                    pass
+                await asyncio.sleep(1.0)
+                await client.connect()
+            except Exception as e:
+                last_err = e
+                break
+        if last_err:
+            raise last_err
     
     try:
-        with telegram_lock:
-            phone_code_hash = asyncio.run(send_code())
+        phone_code_hash = client_pool.run(session_name, send_code, timeout=60)
         
         PENDING_LOGINS[phone_number] = {
             'admin_name': admin_name,
@@ -170,6 +165,8 @@ def send_otp():
         }
         
         return jsonify({'success': True, 'message': 'OTP sent', 'phone': phone_number})
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -196,27 +193,20 @@ def verify_otp():
     if not phone_code_hash:
         return jsonify({'error': 'Invalid session. Please request OTP again.'}), 400
     
-    async def verify_code():
-        client = TelegramClient(session_name, api_id, api_hash)
+    async def verify_code(client):
         try:
-            await client.connect()
-            try:
-                await client.sign_in(phone_number, otp_code, phone_code_hash=phone_code_hash)
+            await client.sign_in(phone_number, otp_code, phone_code_hash=phone_code_hash)
+            return True
+        except SessionPasswordNeededError:
+            if password:
+                await client.sign_in(password=password)
                 return True
-            except SessionPasswordNeededError:
-                if password:
-                    await client.sign_in(password=password)
-                    return True
-                return '2fa_required'
-            except PhoneCodeInvalidError:
-                return False
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+            return '2fa_required'
+        except PhoneCodeInvalidError:
+            return False
     
     try:
-        with telegram_lock:
-            result = asyncio.run(verify_code())
+        result = client_pool.run(session_name, verify_code, timeout=60)
         
         if result == '2fa_required':
             return jsonify({'error': '2fa_required'}), 400
@@ -232,6 +222,8 @@ def verify_otp():
         del PENDING_LOGINS[phone_number]
         
         return jsonify({'success': True, 'admin_name': admin_name, 'redirect': '/'})
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -252,6 +244,11 @@ def session_status():
         })
     return jsonify({'logged_in': False})
 
+@app.route('/api/pool-stats', methods=['GET'])
+@login_required
+def pool_stats():
+    return jsonify(client_pool.stats())
+
 @app.route('/api/search-movie', methods=['POST'])
 @login_required
 def search_movie():
@@ -261,47 +258,43 @@ def search_movie():
     if not query:
         return jsonify({'error': 'Search query required'}), 400
     
-    async def search():
-        phone = session.get('phone')
-        session_name = f"admin_{phone.replace('+', '').replace(' ', '')}"
-        client = TelegramClient(session_name, api_id, api_hash)
+    session_name = session_name_for(session.get('phone'))
+    
+    async def search(client):
+        if not await client.is_user_authorized():
+            await client.start()
         
-        try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                await client.start()
-            
-            results = []
+        results = []
+        
+        async with client_pool.resource_lock(session_name, bot_username), \
+                client.conversation(bot_username, timeout=30) as conv:
+            await conv.send_message(query)
+            replies = [await conv.get_response()]
+            try:
+                for _ in range(3):
+                    replies.append(await conv.get_response(timeout=2))
+            except:
+                pass
             
-            async with client.conversation(bot_username, timeout=30) as conv:
-                await conv.send_message(query)
-                replies = [await conv.get_response()]
-                try:
-                    for _ in range(3):
-                        replies.append(await conv.get_response(timeout=2))
-                except:
-                    pass
-                
-                for msg in replies:
-                    if hasattr(msg, 'buttons') and msg.buttons:
-                        for row_idx, row in enumerate(msg.buttons):
-                            for btn_idx, btn in enumerate(row):
-                                label = getattr(btn, 'text', '').strip()
-                                if label and 'update' not in label.lower() and 'group' not in label.lower() and 'backup' not in label.lower() and 'channel' not in label.lower():
-                                    results.append({
-                                        'title': label,
-                                        'message_id': msg.id,
-                                        'row': row_idx,
-                                        'col': btn_idx
-                                    })
-            return results
-        finally:
-            await client.disconnect()
+            for msg in replies:
+                if hasattr(msg, 'buttons') and msg.buttons:
+                    for row_idx, row in enumerate(msg.buttons):
+                        for btn_idx, btn in enumerate(row):
+                            label = getattr(btn, 'text', '').strip()
+                            if label and 'update' not in label.lower() and 'group' not in label.lower() and 'backup' not in label.lower() and 'channel' not in label.lower():
+                                results.append({
+                                    'title': label,
+                                    'message_id': msg.id,
+                                    'row': row_idx,
+                                    'col': btn_idx
+                                })
+        return results
     
     try:
-        with telegram_lock:
-            results = asyncio.run(search())
+        results = client_pool.run(session_name, search, timeout=60)
         return jsonify({'success': True, 'results': results, 'query': query})
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -315,22 +308,19 @@ def get_stream_link():
     row = data.get('row')
     col = data.get('col')
     
-    async def get_link():
-        phone = session.get('phone')
-        session_name = f"admin_{phone.replace('+', '').replace(' ', '')}"
-        client = TelegramClient(session_name, api_id, api_hash)
+    session_name = session_name_for(session.get('phone'))
+    
+    async def get_link(client):
+        if not await client.is_user_authorized():
+            await client.start()
         
-        try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                await client.start()
-            
+        async with client_pool.resource_lock(session_name, bot_username):
             msg = await client.get_messages(bot_username, ids=message_id)
             if msg and hasattr(msg, 'buttons'):
                 await msg.click(i=row, j=col)
                 await asyncio.sleep(3)
                 messages = await client.get_messages(bot_username, limit=10)
-                
+            
                 for m in messages:
                     if hasattr(m, 'document') or hasattr(m, 'video'):
                         if STREAMING_BOT_USERNAME:
@@ -342,17 +332,16 @@ def get_stream_link():
                                     urls = re.findall(r'(https?://[^\s]+)', bot_msg.text)
                                     if urls:
                                         return urls[0]
-            return None
-        finally:
-            await client.disconnect()
+        return None
     
     try:
-        with telegram_lock:
-            stream_url = asyncio.run(get_link())
+        stream_url = client_pool.run(session_name, get_link, timeout=60)
         
         if stream_url:
             return jsonify({'success': True, 'stream_url': stream_url})
         return jsonify({'error': 'Failed to get stream link'}), 500
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -368,88 +357,88 @@ def download_media():
     if message_id is None or row is None or col is None:
         return jsonify({'error': 'Missing required parameters'}), 400
 
-    async def fetch_and_download():
-        phone = session.get('phone')
-        session_name = f"admin_{phone.replace('+', '').replace(' ', '')}"
-        client = TelegramClient(session_name, api_id, api_hash)
-
-        try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                await client.start()
+    session_name = session_name_for(session.get('phone'))
 
+    async def locate_media(client):
+        # Only the bot exchange needs exclusivity; the download itself runs unlocked
+        async with client_pool.resource_lock(session_name, bot_username):
             msg = await client.get_messages(bot_username, ids=message_id)
-            if msg and hasattr(msg, 'buttons'):
-                # Click the requested button. Some bots respond with edited message, new message, or URL.
-                click_result = None
-                try:
-                    click_result = await msg.click(i=row, j=col)
-                except Exception:
-                    pass
+            if not (msg and hasattr(msg, 'buttons')):
+                return None
 
-                # Handle URL deep-links like t.me/bot?start=XXXX by sending /start payload back to the bot
+            # Click the requested button. Some bots respond with edited message, new message, or URL.
+            click_result = None
+            try:
+                click_result = await msg.click(i=row, j=col)
+            except Exception:
+                pass
+
+            # Handle URL deep-links like t.me/bot?start=XXXX by sending /start payload back to the bot
+            try:
+                url = getattr(click_result, 'url', None)
+                if url and 'start=' in url:
+                    start_payload = '/start ' + url.split('start=')[-1]
+                    await client.send_message(bot_username, start_payload)
+            except Exception:
+                pass
+
+            # Poll for a media message from the bot after clicking
+            media_msg: Optional[object] = None
+            for _ in range(10):  # ~10 seconds total
+                messages = await client.get_messages(bot_username, limit=20)
+                for m in messages:
+                    if getattr(m, 'document', None) or getattr(m, 'video', None) or getattr(m, 'audio', None):
+                        media_msg = m
+                        break
+                if media_msg:
+                    break
+                await asyncio.sleep(1)
+
+            # As a fallback, try to refresh the original message and scan again
+            if not media_msg:
                 try:
-                    url = getattr(click_result, 'url', None)
-                    if url and 'start=' in url:
-                        start_payload = '/start ' + url.split('start=')[-1]
-                        await client.send_message(bot_username, start_payload)
+                    refreshed = await client.get_messages(bot_username, ids=message_id)
+                    if refreshed:
+                        messages = await client.get_messages(bot_username, limit=30)
+                        for m in messages:
+                            if getattr(m, 'document', None) or getattr(m, 'video', None) or getattr(m, 'audio', None):
+                                media_msg = m
+                                break
                 except Exception:
                     pass
 
-                # Poll for a media message from the bot after clicking
-                media_msg: Optional[object] = None
-                for _ in range(10):  # ~10 seconds total
-                    messages = await client.get_messages(bot_username, limit=20)
-                    for m in messages:
-                        if getattr(m, 'document', None) or getattr(m, 'video', None) or getattr(m, 'audio', None):
-                            media_msg = m
-                            break
-                    if media_msg:
-                        break
-                    await asyncio.sleep(1)
-
-                # As a fallback, try to refresh the original message and scan again
-                if not media_msg:
-                    try:
-                        refreshed = await client.get_messages(bot_username, ids=message_id)
-                        if refreshed:
-                            messages = await client.get_messages(bot_username, limit=30)
-                            for m in messages:
-                                if getattr(m, 'document', None) or getattr(m, 'video', None) or getattr(m, 'audio', None):
-                                    media_msg = m
-                                    break
-                    except Exception:
-                        pass
-
-                if not media_msg:
-                    return None, None
-
-                # Determine filename
-                filename = None
-                if getattr(media_msg, 'document', None) and getattr(media_msg.document, 'attributes', None):
-                    for attr in media_msg.document.attributes:
-                        name = getattr(attr, 'file_name', None)
-                        if name:
-                            filename = name
-                            break
-
-                if not filename:
-                    filename = (media_msg.file and getattr(media_msg.file, 'name', None)) or 'movie.mp4'
-
-                # Download to a temporary file
-                tmp_dir = tempfile.gettempdir()
-                safe_name = re.sub(r"[^A-Za-z0-9._-]", '_', filename)
-                tmp_path = _os.path.join(tmp_dir, f"bbhc_{safe_name}")
-
-                await client.download_media(media_msg, file=tmp_path)
-                return tmp_path, safe_name
+            return media_msg
+
+    async def fetch_and_download(client):
+        if not await client.is_user_authorized():
+            await client.start()
+
+        media_msg = await locate_media(client)
+        if not media_msg:
             return None, None
-        finally:
-            await client.disconnect()
+
+        # Determine filename
+        filename = None
+        if getattr(media_msg, 'document', None) and getattr(media_msg.document, 'attributes', None):
+            for attr in media_msg.document.attributes:
+                name = getattr(attr, 'file_name', None)
+                if name:
+                    filename = name
+                    break
+
+        if not filename:
+            filename = (media_msg.file and getattr(media_msg.file, 'name', None)) or 'movie.mp4'
+
+        # Download to a temporary file
+        tmp_dir = tempfile.gettempdir()
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", '_', filename)
+        tmp_path = _os.path.join(tmp_dir, f"bbhc_{safe_name}")
+
+        await client.download_media(media_msg, file=tmp_path)
+        return tmp_path, safe_name
 
     try:
-        with telegram_lock:
-            tmp_path, safe_name = asyncio.run(fetch_and_download())
+        tmp_path, safe_name = client_pool.run(session_name, fetch_and_download)
 
         if not tmp_path or not _os.path.exists(tmp_path):
             return jsonify({'error': 'Failed to fetch media from Telegram'}), 500
@@ -466,6 +455,8 @@ def download_media():
                 pass
 
         return response
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -0,0 +1,151 @@
+"""
+Account pool
+One connected Telethon client per authorized user session, so bot traffic
+is spread over several accounts and their separate flood limits
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from telethon import TelegramClient
+from .message_router import MessageRouter
+from .rate_limit import BotRateLimiter
+
+# Used when no sessions are configured, in order of preference
+DEFAULT_SESSIONS = ("admin_919353589504", "prosearch_single")
+
+
+class AccountShard:
+    """One user account: its client, reply router, load and flood-wait state"""
+
+    def __init__(self, name: str, client: TelegramClient):
+        self.name = name
+        self.client = client
+        self.router: Optional[MessageRouter] = None
+        self.load = 0  # Operations currently running on this account
+        self.operations = 0
+        self.flood_until = 0.0  # monotonic time until which Telegram asked us to back off
+        self.flood_waits = 0
+
+    @contextmanager
+    def busy(self):
+        """Count an operation against this account's load while it runs"""
+        self.load += 1
+        self.operations += 1
+        try:
+            yield self
+        finally:
+            self.load -= 1
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.flood_until
+
+    def mark_flood(self, seconds: float):
+        """Take the account out of rotation for a FloodWait"""
+        self.flood_until = max(self.flood_until, time.monotonic() + seconds)
+        self.flood_waits += 1
+        print(f"🌊 Account {self.name} in FloodWait for {seconds:.0f}s")
+
+    def stats(self) -> dict:
+        return {
+            "load": self.load,
+            "operations": self.operations,
+            "flood_waits": self.flood_waits,
+            "flood_wait_remaining": max(0.0, round(self.flood_until - time.monotonic(), 1)),
+            "router": self.router.stats() if self.router else None,
+        }
+
+
+class AccountPool:
+    """Authorized accounts, picked by least load among those not in FloodWait"""
+
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        session_names: Optional[List[str]],
+        chats: List[str],
+        rate_limiter: Optional[BotRateLimiter] = None
+    ):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.session_names = list(session_names or [])
+        self.chats = chats
+        self.rate_limiter = rate_limiter  # Also applied to the routers' history reads
+        self.shards: List[AccountShard] = []
+        self._by_name: Dict[str, AccountShard] = {}
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def _resolve_session_names(self) -> List[str]:
+        if self.session_names:
+            return self.session_names
+        for name in DEFAULT_SESSIONS:
+            if os.path.exists(f'{name}.session'):
+                return [name]
+        return []
+
+    async def start(self):
+        """Connect every configured session, skipping missing or unauthorized ones"""
+        for name in self._resolve_session_names():
+            if not os.path.exists(f'{name}.session'):
+                print(f"⚠️  Session file {name}.session not found in {os.getcwd()}")
+                continue
+
+            client = TelegramClient(name, self.api_id, self.api_hash)
+            await client.connect()
+            if not await client.is_user_authorized():
+                print(f"⚠️  Session {name} is not authorized, skipping")
+                await client.disconnect()
+                continue
+
+            me = await client.get_me()
+            shard = AccountShard(name, client)
+            # Route bot replies to waiting requests as soon as they arrive
+            limit = functools.partial(self.rate_limiter.call, name) if self.rate_limiter else None
+            shard.router = MessageRouter(client, self.chats, limit=limit)
+            await shard.router.start()
+            self.shards.append(shard)
+            self._by_name[name] = shard
+            print(f"✅ Account {name} authorized as: {me.first_name}")
+
+        if not self.shards:
+            raise RuntimeError("No valid session file found. Please run 'python login.py' first.")
+
+    async def stop(self):
+        for shard in self.shards:
+            if shard.router:
+                shard.router.stop()
+            await shard.client.disconnect()
+        print(f"🔌 Disconnected {len(self.shards)} Telegram account(s)")
+
+    @property
+    def default(self) -> Optional[AccountShard]:
+        return self.shards[0] if self.shards else None
+
+    def get(self, name: Optional[str]) -> AccountShard:
+        """Shard by session name; None means the default account"""
+        if name is None:
+            if not self.shards:
+                raise RuntimeError("Telegram client not started")
+            return self.shards[0]
+        shard = self._by_name.get(name)
+        if shard is None:
+            raise ValueError(f"Account {name} is not connected")
+        return shard
+
+    def pick(self, exclude: Optional[AccountShard] = None) -> AccountShard:
+        """Least-loaded account not in FloodWait (or the one whose wait ends first)"""
+        candidates = [s for s in self.shards if s is not exclude] or self.shards
+        if not candidates:
+            raise RuntimeError("Telegram client not started")
+        available = [s for s in candidates if s.available]
+        if not available:
+            return min(candidates, key=lambda s: s.flood_until)
+        return min(available, key=lambda s: (s.load, s.operations))
+
+    def stats(self) -> dict:
+        return {shard.name: shard.stats() for shard in self.shards}
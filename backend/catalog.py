@@ -0,0 +1,208 @@
+"""
+Local title catalog
+Every parsed search result is indexed by token and trigram so known titles
+can be answered without a bot conversation. Fuzzy scoring is vectorized
+with NumPy over trigram posting lists.
+"""
+import json
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .models import SearchResultItem
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_title(text: str) -> str:
+    """Lowercase, punctuation-free, single-spaced form used for indexing"""
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleCatalog:
+    """Token + trigram inverted index over previously seen search results"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # Document slots; a title seen again reuses its slot with fresh message coordinates
+        self._items: List[SearchResultItem] = []
+        self._titles: List[str] = []
+        self._seen_at: List[float] = []
+        self._tri_counts: List[int] = []
+        self._slot_by_key: Dict[Tuple[str, Optional[int]], int] = {}
+        self._token_index: Dict[str, Set[int]] = {}
+        self._trigram_index: Dict[str, List[int]] = {}
+        # NumPy views rebuilt lazily after inserts
+        self._posting_arrays: Dict[str, np.ndarray] = {}
+        self._seen_at_array: Optional[np.ndarray] = None
+        self._tri_count_array: Optional[np.ndarray] = None
+        self._dirty = False
+        self.lookups = 0
+        self.lookup_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add_many(self, items: Iterable[SearchResultItem], seen_at: Optional[float] = None):
+        seen_at = time.time() if seen_at is None else seen_at
+        for item in items:
+            self.add(item, seen_at)
+
+    def add(self, item: SearchResultItem, seen_at: Optional[float] = None):
+        """Index one result, refreshing the slot of a title that is already known"""
+        seen_at = time.time() if seen_at is None else seen_at
+        title = normalize_title(item.title)
+        if not title:
+            return
+
+        key = (title, item.year)
+        slot = self._slot_by_key.get(key)
+        if slot is not None:
+            self._items[slot] = item
+            self._seen_at[slot] = seen_at
+            if self._seen_at_array is not None:
+                self._seen_at_array[slot] = seen_at
+            self._dirty = True
+            return
+
+        slot = len(self._items)
+        grams = trigrams(title)
+        self._items.append(item)
+        self._titles.append(title)
+        self._seen_at.append(seen_at)
+        self._tri_counts.append(len(grams))
+        self._slot_by_key[key] = slot
+
+        for token in title.split():
+            self._token_index.setdefault(token, set()).add(slot)
+        for gram in grams:
+            self._trigram_index.setdefault(gram, []).append(slot)
+            self._posting_arrays.pop(gram, None)
+
+        self._seen_at_array = None
+        self._tri_count_array = None
+        self._dirty = True
+
+    def _postings(self, gram: str) -> Optional[np.ndarray]:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            postings = self._trigram_index.get(gram)
+            if not postings:
+                return None
+            array = self._posting_arrays[gram] = np.asarray(postings, dtype=np.int32)
+        return array
+
+    def lookup(
+        self,
+        query: str,
+        limit: int = 10,
+        min_score: float = 0.75,
+        max_age: Optional[float] = None,
+    ) -> List[SearchResultItem]:
+        """Best-matching known titles for query, best first
+
+        Score blends trigram containment of the query in the title with Dice
+        similarity; titles whose tokens include every query token score 1.
+        """
+        self.lookups += 1
+        normalized = normalize_title(query)
+        if not normalized or not self._items:
+            return []
+
+        query_grams = trigrams(normalized)
+        arrays = [a for a in (self._postings(g) for g in query_grams) if a is not None]
+        if not arrays:
+            return []
+
+        if self._tri_count_array is None:
+            self._tri_count_array = np.asarray(self._tri_counts, dtype=np.float32)
+        if self._seen_at_array is None:
+            self._seen_at_array = np.asarray(self._seen_at, dtype=np.float64)
+
+        n_docs = len(self._items)
+        shared = np.bincount(np.concatenate(arrays), minlength=n_docs).astype(np.float32)
+        q_count = float(len(query_grams))
+        containment = shared / q_count
+        dice = 2.0 * shared / (q_count + self._tri_count_array)
+        scores = 0.5 * containment + 0.5 * dice
+
+        # Exact token matches always qualify
+        token_sets = [self._token_index.get(t) for t in normalized.split()]
+        if all(token_sets):
+            exact = set.intersection(*token_sets)
+            if exact:
+                scores[np.fromiter(exact, dtype=np.int64)] = 1.0
+
+        mask = scores >= min_score
+        if max_age is not None:
+            mask &= self._seen_at_array >= time.time() - max_age
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+        if candidates.size > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        self.lookup_hits += 1
+        return [self._items[slot] for slot in ordered]
+
+    def titles(self) -> List[Tuple[str, str]]:
+        """(normalized, display) title pairs of every indexed result"""
+        return [(norm, item.title) for norm, item in zip(self._titles, self._items)]
+
+    def load(self):
+        """Rebuild the index from the catalog file, if any (blocking; run it
+        in a worker thread before anything else uses the catalog)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load catalog {self.path}: {e}")
+            return
+        for row in rows:
+            self.add(SearchResultItem.model_validate(row["item"]), row["seen_at"])
+        self._dirty = False
+        print(f"📚 Loaded {len(self)} catalog titles")
+
+    def snapshot(self) -> Optional[List[Tuple[SearchResultItem, float]]]:
+        """(item, seen_at) pairs when the catalog changed since the last snapshot, else None
+
+        Only copies references, so it is cheap on the event loop; slots are
+        replaced rather than mutated, so the copy stays consistent.
+        """
+        if not self.path or not self._dirty:
+            return None
+        self._dirty = False
+        return list(zip(self._items, self._seen_at))
+
+    def write(self, snapshot: List[Tuple[SearchResultItem, float]]):
+        """Serialize a snapshot and atomically replace the catalog file (safe to run in a worker thread)"""
+        rows = [{"item": item.model_dump(mode="json"), "seen_at": seen_at} for item, seen_at in snapshot]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        return {
+            "titles": len(self._items),
+            "tokens": len(self._token_index),
+            "trigrams": len(self._trigram_index),
+            "lookups": self.lookups,
+            "lookup_hits": self.lookup_hits,
+        }
@@ -3,18 +3,364 @@ Job Manager for async streaming requests
 Handles job queue, state tracking, and job lifecycle
 """
 import asyncio
+import collections
+import heapq
+import itertools
+import json
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 from .models import JobStatus
+from .job_store import JobStore
+from .stream_cache import DEMO_STREAM_URL
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 10
+
+JobHandler = Callable[[str, str, int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """The job queue is at capacity; the client should retry later"""
 
 
 class JobManager:
-    """Manages streaming jobs with in-memory storage"""
+    """Manages streaming jobs with in-memory storage
     
-    def __init__(self):
+    Jobs submitted with submit() run on a fixed pool of workers in priority
+    order; the queue is bounded and every job has a deadline. Finished jobs
+    expire after a per-status retention, and the total is capped.
+    """
+    
+    def __init__(
+        self,
+        completed_reuse_seconds: int = 600,
+        max_workers: int = 4,
+        max_queue: int = 100,
+        job_deadline: float = 120,
+        done_retention: float = 3600,
+        failed_retention: float = 300,
+        max_jobs: int = 10000
+    ):
         self.jobs: Dict[str, dict] = {}
         self.lock = asyncio.Lock()
+        # (item_id, quality_index) -> latest job for that stream, used to deduplicate requests
+        self.job_index: Dict[Tuple[str, int], str] = {}
+        self.completed_reuse_seconds = completed_reuse_seconds
+        self.stats = {
+            "created": 0, "attached": 0, "reused": 0,
+            "rejected": 0, "expired": 0, "bumped": 0,
+            "removed": 0, "evicted": 0
+        }
+        self.status_counts = collections.Counter()
+        # job_id -> queues of live subscribers (SSE connections)
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        
+        # Scheduler: heap of [priority, seq, job_id]; entries made stale by a
+        # priority bump stay in the heap and are skipped when popped
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_deadline = job_deadline
+        self.queue: List[list] = []
+        self.queue_entries: Dict[str, list] = {}
+        self.queue_seq = itertools.count()
+        self.queue_ready = asyncio.Condition()
+        self.deadlines: Dict[str, float] = {}
+        self.workers: List[asyncio.Task] = []
+        self.handler: Optional[JobHandler] = None
+        self.running = 0
+        self.store: Optional[JobStore] = None
+        
+        # Expiry: min-heap of (expires_at, job_id) for finished jobs; expiry_at
+        # holds each job's current entry so superseded ones are skipped
+        self.done_retention = done_retention
+        self.failed_retention = failed_retention
+        self.max_jobs = max_jobs
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.expiry_at: Dict[str, float] = {}
+        self.expiry_task: Optional[asyncio.Task] = None
+    
+    def start(
+        self,
+        handler: JobHandler,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        job_deadline: Optional[float] = None,
+        store: Optional[JobStore] = None,
+        done_retention: Optional[float] = None,
+        failed_retention: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        completed_reuse_seconds: Optional[int] = None
+    ):
+        """Start the worker pool; handler(job_id, item_id, quality_index) runs each job
+        
+        With a store, jobs from the previous run are restored first: finished
+        ones are served as before, unfinished ones are queued again.
+        """
+        self.handler = handler
+        if done_retention is not None:
+            self.done_retention = done_retention
+        if failed_retention is not None:
+            self.failed_retention = failed_retention
+        if max_jobs is not None:
+            self.max_jobs = max_jobs
+        if completed_reuse_seconds is not None:
+            self.completed_reuse_seconds = completed_reuse_seconds
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if job_deadline is not None:
+            self.job_deadline = job_deadline
+        # Restored jobs are queued under the limits and deadline configured above
+        if store is not None:
+            self.store = store
+            self._restore()
+            store.start()
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        if self.expiry_task is None or self.expiry_task.done():
+            self.expiry_task = asyncio.create_task(self._expiry_loop())
+    
+    async def stop(self):
+        tasks = self.workers + ([self.expiry_task] if self.expiry_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.expiry_task = None
+        if self.store:
+            await self.store.stop()
+            self.store.close()
+    
+    def _restore(self):
+        requeued = 0
+        for job in sorted(self.store.load(), key=lambda j: j["created_at"]):
+            job_id = job["job_id"]
+            self.jobs[job_id] = job
+            self.job_index[(job["item_id"], job["quality_index"])] = job_id
+            if job["status"] in ("pending", "processing"):
+                job["status"] = "pending"
+                job["progress"] = "Re-queued after restart"
+                self.store.save(job)
+                self._enqueue(job_id, PRIORITY_INTERACTIVE)
+                requeued += 1
+            else:
+                self._schedule_expiry(job)
+            self.status_counts[job["status"]] += 1
+        if self.jobs:
+            self._refresh_positions()
+            print(f"📦 Restored {len(self.jobs)} jobs ({requeued} re-queued)")
+    
+    async def submit(
+        self,
+        item_id: str,
+        quality_index: int,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Tuple[str, bool]:
+        """Queue a stream job, or attach to an existing one; returns (job_id, created)
+        
+        An attaching request with a higher priority bumps a job still in the
+        queue. Raises QueueFullError when a new job would exceed max_queue.
+        """
+        async with self.queue_ready:
+            job_id, created, queued = self._admit(item_id, quality_index, priority)
+            if queued:
+                self._refresh_positions()
+                self.queue_ready.notify()
+        return job_id, created
+    
+    async def submit_many(
+        self,
+        requests: List[Tuple[str, int, int]]
+    ) -> List[Union[Tuple[str, bool], QueueFullError]]:
+        """submit() for several (item_id, quality_index, priority) under one
+        acquisition of the queue
+        
+        Returns (job_id, created) per request, or the QueueFullError for
+        requests that did not fit.
+        """
+        results: List[Union[Tuple[str, bool], QueueFullError]] = []
+        queued_count = 0
+        async with self.queue_ready:
+            for item_id, quality_index, priority in requests:
+                try:
+                    job_id, created, queued = self._admit(item_id, quality_index, priority)
+                except QueueFullError as e:
+                    results.append(e)
+                    continue
+                results.append((job_id, created))
+                queued_count += queued
+            if queued_count:
+                self._refresh_positions()
+                self.queue_ready.notify(queued_count)
+        return results
+    
+    def _admit(self, item_id: str, quality_index: int, priority: int) -> Tuple[str, bool, bool]:
+        """Find/create and enqueue a job; returns (job_id, created, queue changed)"""
+        job_id = self.job_index.get((item_id, quality_index))
+        job = self.jobs.get(job_id) if job_id else None
+        if not (job and job["status"] in ("pending", "processing")) and len(self.queue_entries) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"Stream queue is full ({self.max_queue} jobs waiting)")
+        
+        job_id, created = self.find_or_create_job(item_id, quality_index)
+        if created:
+            self._enqueue(job_id, priority)
+            return job_id, created, True
+        if job_id in self.queue_entries and priority < self.queue_entries[job_id][0]:
+            self.stats["bumped"] += 1
+            self.queue_entries[job_id][2] = None
+            self._enqueue(job_id, priority)
+            return job_id, created, True
+        return job_id, created, False
+    
+    def _enqueue(self, job_id: str, priority: int):
+        entry = [priority, next(self.queue_seq), job_id]
+        self.queue_entries[job_id] = entry
+        heapq.heappush(self.queue, entry)
+        self.deadlines.setdefault(job_id, time.monotonic() + self.job_deadline)
+    
+    def _refresh_positions(self):
+        """Report each waiting job's place in line through its progress text"""
+        for position, entry in enumerate(sorted(self.queue_entries.values()), start=1):
+            job = self.jobs[entry[2]]
+            progress = f"Queued (position {position} of {len(self.queue_entries)})"
+            if job["progress"] != progress:
+                job["progress"] = progress
+                self._publish(job)
+    
+    async def _next_job(self) -> str:
+        async with self.queue_ready:
+            while True:
+                while self.queue:
+                    _, _, job_id = heapq.heappop(self.queue)
+                    if job_id is not None:
+                        del self.queue_entries[job_id]
+                        self._refresh_positions()
+                        return job_id
+                await self.queue_ready.wait()
+    
+    async def _worker(self):
+        while True:
+            job_id = await self._next_job()
+            job = self.jobs.get(job_id)
+            deadline = self.deadlines.pop(job_id, None)
+            if job is None:
+                continue
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats["expired"] += 1
+                await self._fail(job_id, "Timed out waiting in queue")
+                continue
+            
+            self.running += 1
+            try:
+                await asyncio.wait_for(
+                    self.handler(job_id, job["item_id"], job["quality_index"]),
+                    timeout=remaining
+                )
+            except asyncio.TimeoutError:
+                self.stats["expired"] += 1
+                await self._fail(job_id, f"Timed out after {self.job_deadline:.0f}s")
+            except Exception as e:
+                await self._fail(job_id, str(e))
+            finally:
+                self.running -= 1
+    
+    async def _fail(self, job_id: str, error: str):
+        """mark_failed that tolerates jobs removed by cleanup meanwhile"""
+        try:
+            await self.mark_failed(job_id, error)
+        except ValueError:
+            pass
+    
+    def _schedule_expiry(self, job: dict):
+        retention = self.done_retention if job["status"] == "done" else self.failed_retention
+        expires_at = job["updated_at"].timestamp() + retention
+        self.expiry_at[job["job_id"]] = expires_at
+        heapq.heappush(self.expiry_heap, (expires_at, job["job_id"]))
+    
+    def expire_jobs(self, now: Optional[float] = None) -> int:
+        """Remove finished jobs past their retention, then the soonest-expiring
+        ones while over max_jobs; O(log n) per job removed"""
+        now = time.time() if now is None else now
+        removed = []
+        while self.expiry_heap:
+            expires_at, job_id = self.expiry_heap[0]
+            if self.expiry_at.get(job_id) != expires_at:
+                heapq.heappop(self.expiry_heap)
+                continue
+            over_cap = len(self.jobs) - len(removed) > self.max_jobs
+            if expires_at > now and not over_cap:
+                break
+            heapq.heappop(self.expiry_heap)
+            if over_cap and expires_at > now:
+                self.stats["evicted"] += 1
+            removed.append(job_id)
+            self._remove_job(job_id)
+        if removed and self.store:
+            self.store.delete(removed)
+        return len(removed)
+    
+    async def _expiry_loop(self, interval: float = 30):
+        while True:
+            await asyncio.sleep(interval)
+            self.expire_jobs()
+    
+    def _remove_job(self, job_id: str):
+        job = self.jobs.pop(job_id)
+        self.status_counts[job["status"]] -= 1
+        self.stats["removed"] += 1
+        self.deadlines.pop(job_id, None)
+        self.expiry_at.pop(job_id, None)
+        entry = self.queue_entries.pop(job_id, None)
+        if entry:
+            entry[2] = None
+        key = (job["item_id"], job["quality_index"])
+        if self.job_index.get(key) == job_id:
+            del self.job_index[key]
+    
+    def scheduler_stats(self) -> dict:
+        return {
+            **self.stats,
+            "jobs": len(self.jobs),
+            "by_status": {status: count for status, count in self.status_counts.items() if count},
+            "queued": len(self.queue_entries),
+            "running": self.running,
+            "workers": len(self.workers),
+            "max_queue": self.max_queue,
+            "store": self.store.stats() if self.store else None,
+        }
+    
+    def find_or_create_job(self, item_id: str, quality_index: int) -> Tuple[str, bool]:
+        """Return (job_id, created) for a stream request
+        
+        Attaches to a pending/processing job for the same item and quality, or
+        reuses one that finished successfully within completed_reuse_seconds
+        (never a demo fallback, which is no real link for the item).
+        """
+        job_id = self.job_index.get((item_id, quality_index))
+        job = self.jobs.get(job_id) if job_id else None
+        
+        if job:
+            if job["status"] in ("pending", "processing"):
+                self.stats["attached"] += 1
+                return job_id, False
+            
+            age = (datetime.now() - job["updated_at"]).total_seconds()
+            if (
+                job["status"] == "done"
+                and age < self.completed_reuse_seconds
+                and job["stream_url"] != DEMO_STREAM_URL
+            ):
+                self.stats["reused"] += 1
+                return job_id, False
+        
+        return self.create_job(item_id, quality_index), True
     
     def create_job(self, item_id: str, quality_index: int) -> str:
         """Create a new streaming job"""
@@ -32,6 +378,13 @@ class JobManager:
             "updated_at": now,
             "progress": "Job created"
         }
+        self.job_index[(item_id, quality_index)] = job_id
+        self.stats["created"] += 1
+        self.status_counts["pending"] += 1
+        if len(self.jobs) > self.max_jobs:
+            self.expire_jobs()
+        if self.store:
+            self.store.save(self.jobs[job_id])
         
         return job_id
     
@@ -50,7 +403,9 @@ class JobManager:
             
             job = self.jobs[job_id]
             
-            if status:
+            if status and status != job["status"]:
+                self.status_counts[job["status"]] -= 1
+                self.status_counts[status] += 1
                 job["status"] = status
             if stream_url:
                 job["stream_url"] = stream_url
@@ -60,6 +415,47 @@ class JobManager:
                 job["progress"] = progress
             
             job["updated_at"] = datetime.now()
+            if status in ("done", "failed"):
+                self._schedule_expiry(job)
+            self._publish(job)
+            if self.store:
+                self.store.save(job)
+    
+    @staticmethod
+    def job_event(job: dict) -> str:
+        """JSON payload of a job state, as sent to subscribers"""
+        return json.dumps(job, default=lambda value: value.isoformat())
+    
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue that receives (status, JSON event) on every transition of job_id"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[job_id]
+    
+    def _publish(self, job: dict):
+        """Fan a transition out to subscribers, serializing it once"""
+        queues = self.subscribers.get(job["job_id"])
+        if not queues:
+            return
+        event = self.job_event(job)
+        for queue in queues:
+            queue.put_nowait((job["status"], event))
+    
+    def get_jobs(self, job_ids: List[str]) -> Tuple[List[JobStatus], List[str]]:
+        """Statuses of several jobs from one consistent view, plus the ids not found"""
+        # Copy the rows first: no await happens between here and the return,
+        # so every status reflects the same moment
+        rows = [(job_id, self.jobs.get(job_id)) for job_id in job_ids]
+        found = [JobStatus(**job) for _, job in rows if job]
+        missing = [job_id for job_id, job in rows if not job]
+        return found, missing
     
     def get_job(self, job_id: str) -> Optional[JobStatus]:
         """Get job status"""
@@ -92,7 +488,11 @@ class JobManager:
         )
     
     def cleanup_old_jobs(self, max_age_seconds: int = 3600):
-        """Remove jobs older than max_age_seconds"""
+        """Remove jobs older than max_age_seconds, whatever their status
+        
+        Finished jobs also expire on their own; this is the manual sweep
+        behind DELETE /api/cache.
+        """
         now = datetime.now()
         to_remove = []
         
@@ -102,7 +502,9 @@ class JobManager:
                 to_remove.append(job_id)
         
         for job_id in to_remove:
-            del self.jobs[job_id]
+            self._remove_job(job_id)
+        if self.store:
+            self.store.delete(to_remove)
         
         return len(to_remove)
 
@@ -0,0 +1,133 @@
+"""
+Durable job store
+SQLite mirror of JobManager.jobs so jobs survive restarts. Changes are
+staged in memory and written in batches by a background task, keeping
+disk I/O off the request path.
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from .sqlite_store import open_database
+
+_COLUMNS = ("job_id", "item_id", "quality_index", "status", "stream_url",
+            "error", "created_at", "updated_at", "progress")
+
+
+class JobStore:
+    """Write-behind SQLite table of streaming jobs"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn = open_database(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " item_id TEXT NOT NULL,"
+            " quality_index INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " stream_url TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " progress TEXT)"
+        )
+        # job_id -> row to upsert, or None to delete; only touched on the event loop
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.rows_written = 0
+        self.batches = 0
+
+    def load(self) -> List[dict]:
+        """Every stored job as a JobManager job dict"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs").fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(_COLUMNS, row))
+            job["created_at"] = datetime.fromtimestamp(job["created_at"])
+            job["updated_at"] = datetime.fromtimestamp(job["updated_at"])
+            jobs.append(job)
+        return jobs
+
+    def save(self, job: dict):
+        """Stage the current state of a job; written on the next flush"""
+        self._pending[job["job_id"]] = tuple(
+            job[col].timestamp() if col in ("created_at", "updated_at") else job[col]
+            for col in _COLUMNS
+        )
+
+    def delete(self, job_ids: Iterable[str]):
+        for job_id in job_ids:
+            self._pending[job_id] = None
+
+    def flush(self, batch: Optional[Dict[str, Optional[tuple]]] = None) -> int:
+        """Write a batch (default: everything staged) in one transaction"""
+        if batch is None:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        upserts = [row for row in batch.values() if row is not None]
+        deletes = [(job_id,) for job_id, row in batch.items() if row is None]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.rows_written += len(batch)
+        self.batches += 1
+        return len(batch)
+
+    def start(self):
+        if self._flusher is None or self._flusher.done():
+            self._stopping = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background writer after it finishes any batch in progress, then flush the rest"""
+        if self._flusher:
+            self._stopping.set()
+            await self._flusher
+            self._flusher = None
+        self.flush()
+
+    async def _flush_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._pending:
+                continue
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self.flush, batch)
+            except Exception as e:
+                print(f"⚠️ Job store flush failed: {e}")
+                # Keep the batch unless newer changes superseded it
+                for job_id, row in batch.items():
+                    self._pending.setdefault(job_id, row)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "pending_writes": len(self._pending),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+        }
@@ -12,9 +12,9 @@ if sys.platform == 'win32':
         sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
         sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # Add parent directory to path for imports
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -28,35 +28,71 @@ os.chdir(parent_dir)
 try:
     from models import (
         SearchResponse,
+        SuggestResponse,
         StreamRequest,
         StreamResponse,
+        BatchStreamRequest,
+        BatchStreamResult,
+        BatchStreamResponse,
+        JobsResponse,
         JobStatus,
         ErrorResponse
     )
     from telegram_service import TelegramService
-    from job_manager import job_manager
+    from job_manager import job_manager, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+    from stream_cache import StreamUrlCache
+    from search_store import SearchResultStore
+    from catalog import TitleCatalog
+    from job_store import JobStore
+    from prefetch import StreamPrefetcher
+    from stream_cache import item_key
 except ImportError:
     from backend.models import (
         SearchResponse,
+        SuggestResponse,
         StreamRequest,
         StreamResponse,
+        BatchStreamRequest,
+        BatchStreamResult,
+        BatchStreamResponse,
+        JobsResponse,
         JobStatus,
         ErrorResponse
     )
     from backend.telegram_service import TelegramService
-    from backend.job_manager import job_manager
+    from backend.job_manager import job_manager, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+    from backend.stream_cache import StreamUrlCache
+    from backend.search_store import SearchResultStore
+    from backend.catalog import TitleCatalog
+    from backend.job_store import JobStore
+    from backend.prefetch import StreamPrefetcher
+    from backend.stream_cache import item_key
+
+from config import (
+    API_ID, API_HASH, SEARCH_BOT_USERNAME, STREAMING_BOT_USERNAME, TELEGRAM_SESSIONS,
+    BOT_RATE_PER_SECOND, BOT_RATE_BURST,
+    CACHE_DIR, STREAM_URL_CACHE_TTL, STREAM_URL_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_FRESH_SECONDS, SEARCH_CACHE_STALE_SECONDS, SEARCH_STORE_MAX_ENTRIES,
+    CATALOG_MAX_AGE_SECONDS, CATALOG_MIN_SCORE,
+    PREFETCH_ENABLED, PREFETCH_TOP_K, PREFETCH_PER_MINUTE,
+    STREAM_WORKERS, STREAM_QUEUE_LIMIT, STREAM_JOB_DEADLINE,
+    JOB_STORE_ENABLED, JOB_RETENTION_DONE_SECONDS, JOB_RETENTION_FAILED_SECONDS, JOB_MAX_COUNT,
+    JOB_REUSE_SECONDS
+)
 
-from config import API_ID, API_HASH, SEARCH_BOT_USERNAME, STREAMING_BOT_USERNAME
 
+# Comment line sent on idle SSE connections so proxies keep them open
+SSE_KEEPALIVE_SECONDS = 15
 
 # Global telegram service
 telegram_service: TelegramService = None
+prefetcher: StreamPrefetcher = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan - startup and shutdown"""
-    global telegram_service
+    global telegram_service, prefetcher
     
     # Startup
     print("=" * 60)
@@ -68,12 +104,50 @@ async def lifespan(app: FastAPI):
         api_id=int(API_ID),
         api_hash=API_HASH,
         search_bot=SEARCH_BOT_USERNAME,
-        streaming_bot=STREAMING_BOT_USERNAME
+        streaming_bot=STREAMING_BOT_USERNAME,
+        url_cache=StreamUrlCache(
+            os.path.join(CACHE_DIR, "stream_urls.db"),
+            ttl=STREAM_URL_CACHE_TTL,
+            max_entries=STREAM_URL_CACHE_MAX_ENTRIES
+        ),
+        search_store=SearchResultStore(
+            os.path.join(CACHE_DIR, "search_results.db"),
+            max_age=SEARCH_CACHE_FRESH_SECONDS + SEARCH_CACHE_STALE_SECONDS,
+            max_entries=SEARCH_STORE_MAX_ENTRIES
+        ),
+        cache_ttl=SEARCH_CACHE_FRESH_SECONDS,
+        stale_ttl=SEARCH_CACHE_STALE_SECONDS,
+        catalog=TitleCatalog(os.path.join(CACHE_DIR, "catalog.json")),
+        catalog_max_age=CATALOG_MAX_AGE_SECONDS,
+        catalog_min_score=CATALOG_MIN_SCORE,
+        session_names=TELEGRAM_SESSIONS,
+        bot_rate=BOT_RATE_PER_SECOND,
+        bot_burst=BOT_RATE_BURST
     )
     
     await telegram_service.start()
+    job_manager.start(
+        process_stream_job,
+        max_workers=STREAM_WORKERS,
+        max_queue=STREAM_QUEUE_LIMIT,
+        job_deadline=STREAM_JOB_DEADLINE,
+        store=JobStore(os.path.join(CACHE_DIR, "jobs.db")) if JOB_STORE_ENABLED else None,
+        done_retention=JOB_RETENTION_DONE_SECONDS,
+        failed_retention=JOB_RETENTION_FAILED_SECONDS,
+        max_jobs=JOB_MAX_COUNT,
+        completed_reuse_seconds=JOB_REUSE_SECONDS
+    )
     print(f"✅ Connected to search bot: {SEARCH_BOT_USERNAME}")
     print(f"✅ Streaming bot: {STREAMING_BOT_USERNAME}")
+    
+    if PREFETCH_ENABLED:
+        prefetcher = StreamPrefetcher(
+            telegram_service,
+            top_k=PREFETCH_TOP_K,
+            rate_per_minute=PREFETCH_PER_MINUTE
+        )
+        prefetcher.start()
+        print(f"🔮 Stream prefetch enabled (top {PREFETCH_TOP_K}, {PREFETCH_PER_MINUTE}/min)")
     print("🚀 Backend ready on http://localhost:5000")
     print("=" * 60)
     
@@ -81,6 +155,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("\n🛑 Shutting down backend...")
+    if prefetcher:
+        await prefetcher.stop()
+    await job_manager.stop()
     await telegram_service.stop()
     print("✅ Backend stopped")
 
@@ -112,8 +189,13 @@ async def root():
         "status": "running",
         "endpoints": {
             "search": "/api/search?q=movie_name",
+            "suggest": "/api/suggest?q=partial_title",
             "stream": "/api/stream (POST)",
-            "job_status": "/api/job/{job_id}"
+            "job_status": "/api/job/{job_id}",
+            "job_events": "/api/job/{job_id}/events (SSE)",
+            "stream_batch": "/api/stream/batch (POST)",
+            "jobs": "/api/jobs?ids=id1,id2",
+            "stats": "/api/stats"
         }
     }
 
@@ -130,9 +212,16 @@ async def search_movies(
     try:
         print(f"\n🔍 Search request: {q}")
         
+        # A new search makes the previous prefetches moot
+        if prefetcher:
+            prefetcher.cancel_all()
+        
         # Search via Telegram
         results = await telegram_service.search_movie(q)
         
+        if prefetcher:
+            prefetcher.schedule(results)
+        
         return SearchResponse(
             query=q,
             results=results,
@@ -148,6 +237,22 @@ async def search_movies(
         )
 
 
+@app.get("/api/suggest", response_model=SuggestResponse)
+async def suggest_titles(
+    q: str = Query(..., description="Partial title", min_length=1),
+    limit: int = Query(10, ge=1, le=50, description="Maximum suggestions")
+):
+    """
+    Typeahead suggestions served from local data
+    
+    Uses past search results and queries only; never contacts Telegram
+    """
+    return SuggestResponse(
+        query=q,
+        suggestions=telegram_service.suggest(q, limit)
+    )
+
+
 @app.post("/api/stream", response_model=StreamResponse)
 async def request_stream(request: StreamRequest):
     """
@@ -159,16 +264,36 @@ async def request_stream(request: StreamRequest):
     try:
         print(f"\n📺 Stream request: {request.item_id}, quality index: {request.quality_index}")
         
-        # Create job
-        job_id = job_manager.create_job(request.item_id, request.quality_index)
+        # Free Telegram for this request unless the prefetch is already resolving it
+        if prefetcher:
+            prefetcher.preempt(keep_key=item_key(request.item_id, request.quality_index))
+        
+        # Queue job, or attach to one already queued/running/finished for this item and quality
+        priority = PRIORITY_PREFETCH if request.priority == "prefetch" else PRIORITY_INTERACTIVE
+        job_id, created = await job_manager.submit(request.item_id, request.quality_index, priority)
         
-        # Process job asynchronously
-        asyncio.create_task(process_stream_job(job_id, request.item_id, request.quality_index))
+        if not created:
+            job = job_manager.get_job(job_id)
+            print(f"🔗 Reusing job {job_id} ({job.status})")
+            return StreamResponse(
+                job_id=job_id,
+                status=job.status,
+                message="Stream ready" if job.status == "done" else "Attached to existing request, processing...",
+                deadline_seconds=job_manager.job_deadline
+            )
         
         return StreamResponse(
             job_id=job_id,
             status="pending",
-            message="Stream request received, processing..."
+            message="Stream request received, processing...",
+            deadline_seconds=job_manager.job_deadline
+        )
+    
+    except QueueFullError as e:
+        print(f"⚠️ Stream request rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e)
         )
     
     except Exception as e:
@@ -179,6 +304,72 @@ async def request_stream(request: StreamRequest):
         )
 
 
+@app.post("/api/stream/batch", response_model=BatchStreamResponse)
+async def request_stream_batch(request: BatchStreamRequest):
+    """
+    Request streaming URLs for several items at once (e.g. watchlist warmup)
+    
+    Each entry is queued, attached to an existing job, or rejected when
+    the queue is full; track them with /api/jobs
+    """
+    print(f"\n📺 Batch stream request: {len(request.items)} items")
+    outcomes = await job_manager.submit_many([
+        (
+            item.item_id,
+            item.quality_index,
+            PRIORITY_PREFETCH if item.priority == "prefetch" else PRIORITY_INTERACTIVE
+        )
+        for item in request.items
+    ])
+    
+    results = []
+    for item, outcome in zip(request.items, outcomes):
+        if isinstance(outcome, QueueFullError):
+            results.append(BatchStreamResult(
+                item_id=item.item_id,
+                quality_index=item.quality_index,
+                status="rejected",
+                message=str(outcome)
+            ))
+            continue
+        job_id, created = outcome
+        status = "pending" if created else job_manager.jobs[job_id]["status"]
+        results.append(BatchStreamResult(
+            item_id=item.item_id,
+            quality_index=item.quality_index,
+            job_id=job_id,
+            status=status,
+            message="Stream request received, processing..." if created else "Attached to existing request"
+        ))
+    
+    rejected = sum(1 for result in results if result.status == "rejected")
+    return BatchStreamResponse(
+        results=results,
+        accepted=len(results) - rejected,
+        rejected=rejected
+    )
+
+
+@app.get("/api/jobs", response_model=JobsResponse)
+async def get_jobs_status(
+    ids: str = Query(..., description="Comma-separated job IDs", min_length=1)
+):
+    """
+    Get status of several streaming jobs in one response
+    
+    All statuses come from the same snapshot of job state
+    """
+    job_ids = [job_id.strip() for job_id in ids.split(",") if job_id.strip()]
+    if len(job_ids) > 100:
+        raise HTTPException(
+            status_code=400,
+            detail="At most 100 job IDs per request"
+        )
+    
+    jobs, missing = job_manager.get_jobs(job_ids)
+    return JobsResponse(jobs=jobs, missing=missing)
+
+
 @app.get("/api/job/{job_id}", response_model=JobStatus)
 async def get_job_status(job_id: str):
     """
@@ -197,6 +388,44 @@ async def get_job_status(job_id: str):
     return job
 
 
+@app.get("/api/job/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events feed of a streaming job
+    
+    Sends the current state, then every transition until the job is done or failed
+    """
+    job = job_manager.jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} not found"
+        )
+    
+    async def event_stream():
+        queue = job_manager.subscribe(job_id)
+        try:
+            yield f"data: {job_manager.job_event(job)}\n\n"
+            status = job["status"]
+            while status not in ("done", "failed"):
+                try:
+                    status, event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {event}\n\n"
+        finally:
+            job_manager.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.delete("/api/cache")
 async def clear_cache():
     """Clear message cache and old jobs"""
@@ -209,18 +438,31 @@ async def clear_cache():
     }
 
 
+@app.get("/api/stats")
+async def get_stats():
+    """Cache, coalescing and reply-routing statistics"""
+    return {
+        "telegram": telegram_service.get_stats(),
+        "jobs": job_manager.scheduler_stats(),
+        "prefetch": prefetcher.stats() if prefetcher else None
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    url_cache = telegram_service.url_cache
     return {
         "status": "healthy",
-        "telegram_connected": telegram_service.client is not None and telegram_service.client.is_connected()
+        "telegram_connected": telegram_service.client is not None and telegram_service.client.is_connected(),
+        "telegram_accounts": len(telegram_service.accounts),
+        "stream_url_cache": url_cache.stats() if url_cache else None
     }
 
 
 async def process_stream_job(job_id: str, item_id: str, quality_index: int):
     """
-    Background task to process streaming request
+    Stream job handler, run by the job manager's worker pool
     
     1. Mark job as processing
     2. Click button / handle callback
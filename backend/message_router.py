@@ -0,0 +1,217 @@
+"""
+Message Router
+Correlates bot replies with waiting callers using Telethon update events
+instead of fixed sleeps followed by get_messages scans
+"""
+import asyncio
+import re
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+from telethon import TelegramClient, events
+from telethon.tl.types import Message
+
+URL_PATTERN = re.compile(r'(https?://[^\s]+)')
+
+Predicate = Callable[[Message], bool]
+
+# limit(chat, fn) -> result of fn(), run once the chat's rate limit allows it
+Limiter = Callable[[str, Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+
+def has_file(message: Message) -> bool:
+    """Message carries a video or document"""
+    return bool(getattr(message, 'document', None) or getattr(message, 'video', None))
+
+
+def has_url(message: Message) -> bool:
+    """Message text contains an http(s) link"""
+    return bool(message.text and URL_PATTERN.search(message.text))
+
+
+def extract_url(message: Message) -> Optional[str]:
+    """First http(s) link in the message text"""
+    match = URL_PATTERN.search(message.text or "")
+    return match.group(1).strip() if match else None
+
+
+class _Waiter:
+    __slots__ = ("chat", "predicate", "after_id", "future")
+
+    def __init__(self, chat: str, predicate: Predicate, after_id: int, future: asyncio.Future):
+        self.chat = chat
+        self.predicate = predicate
+        self.after_id = after_id
+        self.future = future
+
+
+class MessageRouter:
+    """Resolves awaitables as soon as a matching message arrives in a watched chat
+
+    Each incoming message is handed to at most one waiter, oldest first, so
+    callers that register in request order receive replies in that order.
+    """
+
+    def __init__(self, client: TelegramClient, chats: List[str], history_size: int = 50, limit: Optional[Limiter] = None):
+        self.client = client
+        self.chats = chats
+        self.history_size = history_size
+        self.limit = limit  # History reads share the account's per-bot rate limit
+        self._peer_ids: Dict[str, int] = {}
+        self._recent: Dict[int, Deque[Message]] = {}
+        self._last_ids: Dict[int, int] = {}
+        self._waiters: Dict[int, List[_Waiter]] = {}
+        self._claimed: Dict[int, Set[int]] = {}  # Message ids already handed to a waiter
+        self._handlers = []
+        self.resolved = 0
+        self.timeouts = 0
+        self.fallback_hits = 0
+
+    async def _get_messages(self, chat: str, **kwargs) -> List[Message]:
+        if self.limit is None:
+            return await self.client.get_messages(chat, **kwargs)
+        return await self.limit(chat, lambda: self.client.get_messages(chat, **kwargs))
+
+    async def start(self):
+        """Resolve watched chats and register update handlers"""
+        for chat in self.chats:
+            peer_id = await self.client.get_peer_id(chat)
+            self._peer_ids[chat] = peer_id
+            self._recent[peer_id] = deque(maxlen=self.history_size)
+            self._waiters[peer_id] = []
+            self._claimed[peer_id] = set()
+            latest = await self._get_messages(chat, limit=1)
+            self._last_ids[peer_id] = latest[0].id if latest else 0
+
+        peers = list(self._peer_ids.values())
+        for builder in (events.NewMessage(chats=peers), events.MessageEdited(chats=peers)):
+            self.client.add_event_handler(self._on_message, builder)
+            self._handlers.append(builder)
+        print(f"📡 Message router watching: {', '.join(self.chats)}")
+
+    def stop(self):
+        """Unregister handlers and cancel pending waiters"""
+        for builder in self._handlers:
+            self.client.remove_event_handler(self._on_message, builder)
+        self._handlers.clear()
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                waiter.future.cancel()
+            waiters.clear()
+
+    def last_id(self, chat: str) -> int:
+        """Highest message id seen in chat, usable as after_id before a click"""
+        return self._last_ids.get(self._peer_ids[chat], 0)
+
+    async def _on_message(self, event):
+        message = event.message
+        peer_id = event.chat_id
+        recent = self._recent.get(peer_id)
+        if recent is None:
+            return
+
+        # Edits replace the buffered copy so later waiters see the final text
+        for idx, buffered in enumerate(recent):
+            if buffered.id == message.id:
+                recent[idx] = message
+                break
+        else:
+            recent.append(message)
+        self._last_ids[peer_id] = max(self._last_ids.get(peer_id, 0), message.id)
+
+        if message.out:
+            return
+
+        if message.id in self._claimed[peer_id]:
+            return
+
+        for waiter in self._waiters[peer_id]:
+            if waiter.future.done() or message.id <= waiter.after_id:
+                continue
+            try:
+                matched = waiter.predicate(message)
+            except Exception:
+                matched = False
+            if matched:
+                self._claim(peer_id, message)
+                waiter.future.set_result(message)
+                self.resolved += 1
+                break
+
+    def _claim(self, peer_id: int, message: Message):
+        claimed = self._claimed[peer_id]
+        claimed.add(message.id)
+        if len(claimed) > self.history_size * 2:
+            # Ids older than the buffer can't be matched again; forget them
+            recent = self._recent[peer_id]
+            oldest = recent[0].id if recent else message.id
+            self._claimed[peer_id] = {i for i in claimed if i >= oldest}
+
+    def _claim_buffered(self, peer_id: int, predicate: Predicate, after_id: int) -> Optional[Message]:
+        claimed = self._claimed[peer_id]
+        for message in self._recent[peer_id]:
+            if not message.out and message.id > after_id and message.id not in claimed and predicate(message):
+                self._claim(peer_id, message)
+                return message
+        return None
+
+    def expect(self, chat: str, predicate: Predicate, after_id: int = 0) -> _Waiter:
+        """Register for the next unclaimed incoming message newer than after_id
+        matching predicate; collect it later with wait()
+
+        Registering right after sending (before any await) fixes the caller's
+        place in line without holding anything while the reply is awaited.
+        """
+        peer_id = self._peer_ids[chat]
+        waiter = _Waiter(chat, predicate, after_id, asyncio.get_running_loop().create_future())
+
+        # The reply may already have arrived
+        message = self._claim_buffered(peer_id, predicate, after_id)
+        if message is not None:
+            self.resolved += 1
+            waiter.future.set_result(message)
+        else:
+            self._waiters[peer_id].append(waiter)
+        return waiter
+
+    async def wait(self, waiter: _Waiter, timeout: float = 20.0, fallback_scan: bool = True) -> Message:
+        """Await a waiter from expect(); raises asyncio.TimeoutError once the deadline passes"""
+        peer_id = self._peer_ids[waiter.chat]
+        try:
+            return await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # Updates can be dropped on reconnects; one history read covers that case
+            if fallback_scan:
+                messages = await self._get_messages(waiter.chat, limit=20, min_id=waiter.after_id)
+                claimed = self._claimed[peer_id]
+                for message in reversed(messages):
+                    if not message.out and message.id not in claimed and waiter.predicate(message):
+                        self._claim(peer_id, message)
+                        self.fallback_hits += 1
+                        return message
+            self.timeouts += 1
+            raise
+        finally:
+            if waiter in self._waiters[peer_id]:
+                self._waiters[peer_id].remove(waiter)
+
+    async def wait_for(
+        self,
+        chat: str,
+        predicate: Predicate,
+        after_id: int = 0,
+        timeout: float = 20.0,
+        fallback_scan: bool = True,
+    ) -> Message:
+        """Return the first unclaimed incoming message in chat newer than after_id that matches predicate
+
+        Raises asyncio.TimeoutError once the deadline passes.
+        """
+        return await self.wait(self.expect(chat, predicate, after_id), timeout, fallback_scan)
+
+    def stats(self) -> dict:
+        return {
+            "resolved": self.resolved,
+            "timeouts": self.timeouts,
+            "fallback_hits": self.fallback_hits,
+            "pending_waiters": sum(len(w) for w in self._waiters.values()),
+        }
@@ -35,10 +35,19 @@ class SearchResponse(BaseModel):
     success: bool = True
 
 
+class SuggestResponse(BaseModel):
+    """Response for typeahead suggestions"""
+    query: str
+    suggestions: List[str]
+
+
 class StreamRequest(BaseModel):
     """Request to start streaming"""
     item_id: str = Field(..., description="Result item ID from search")
     quality_index: int = Field(0, description="Index of quality option to use")
+    priority: Literal["interactive", "prefetch"] = Field(
+        "interactive", description="Prefetch/warmup jobs run only when no interactive job is waiting"
+    )
 
 
 class JobStatus(BaseModel):
@@ -57,6 +66,34 @@ class StreamResponse(BaseModel):
     job_id: str
     status: str
     message: str = "Stream request received"
+    deadline_seconds: Optional[float] = None  # Server gives up on the job after this long
+
+
+class BatchStreamRequest(BaseModel):
+    """Several stream requests submitted at once"""
+    items: List[StreamRequest] = Field(..., min_length=1, max_length=50)
+
+
+class BatchStreamResult(BaseModel):
+    """Outcome of one entry of a batch stream request"""
+    item_id: str
+    quality_index: int
+    job_id: Optional[str] = None
+    status: str
+    message: str
+
+
+class BatchStreamResponse(BaseModel):
+    """Response for batch stream endpoint"""
+    results: List[BatchStreamResult]
+    accepted: int
+    rejected: int
+
+
+class JobsResponse(BaseModel):
+    """Statuses of several jobs"""
+    jobs: List[JobStatus]
+    missing: List[str] = Field(default_factory=list, description="Requested job IDs that don't exist")
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,137 @@
+"""
+Speculative stream link prefetch
+Resolves stream URLs for the top search results in the background so a
+later /api/stream finds them in the URL cache
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from .models import SearchResultItem
+from .rate_limit import TokenBucket
+from .stream_cache import item_key
+from .telegram_service import ResolutionPreempted
+
+
+class StreamPrefetcher:
+    """Low-priority worker that warms the stream URL cache
+
+    One prefetch runs at a time, only while no interactive search or stream
+    is in flight, and at most `rate_per_minute` resolutions per minute.
+    """
+
+    def __init__(
+        self,
+        telegram_service,
+        top_k: int = 3,
+        rate_per_minute: float = 6,
+        max_queue: int = 20,
+        idle_poll: float = 0.5,
+    ):
+        self.telegram_service = telegram_service
+        self.top_k = top_k
+        self.bucket = TokenBucket(rate=rate_per_minute / 60.0, capacity=1.0)
+        self.idle_poll = idle_poll
+        self._queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue(maxsize=max_queue)
+        self._queued = set()
+        self._current: Optional[str] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats_counters = {
+            "scheduled": 0,
+            "dropped": 0,
+            "resolved": 0,
+            "failed": 0,
+            "preempted": 0,
+        }
+
+    def start(self):
+        self._stopping = False
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        self.cancel_all()
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def schedule(self, results: List[SearchResultItem]):
+        """Queue the default quality of the top results (cached ones are skipped by the worker)"""
+        for item in results[:self.top_k]:
+            if not item.qualities:
+                continue
+            key = item_key(item.id, 0)
+            if key in self._queued or key == self._current:
+                continue
+            try:
+                self._queue.put_nowait((item.id, 0))
+            except asyncio.QueueFull:
+                self.stats_counters["dropped"] += 1
+                continue
+            self._queued.add(key)
+            self.stats_counters["scheduled"] += 1
+
+    def preempt(self, keep_key: Optional[str] = None) -> bool:
+        """Cancel the running prefetch unless it is for keep_key, someone else
+        awaits it, or it has already messaged a bot (whose late reply would
+        then be claimed by the next request on that chat)"""
+        key = self._current
+        if key is None or key == keep_key:
+            return False
+        if self.telegram_service.resolution_sent(key):
+            return False
+        if self.telegram_service.stream_flight.cancel_if_unshared(key):
+            self.stats_counters["preempted"] += 1
+            return True
+        return False
+
+    def cancel_all(self):
+        """Drop everything queued and cancel the running prefetch"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queued.clear()
+        self.preempt()
+
+    async def _run(self):
+        while True:
+            item_id, quality_index = await self._queue.get()
+            key = item_key(item_id, quality_index)
+            self._queued.discard(key)
+
+            # Interactive work always goes first
+            while self.telegram_service.interactive_active > 0:
+                await asyncio.sleep(self.idle_poll)
+            await self.bucket.acquire()
+            if await self.telegram_service.get_cached_stream_url(item_id, quality_index):
+                continue
+
+            self._current = key
+            try:
+                await self.telegram_service.get_stream_url(item_id, quality_index, interactive=False)
+                self.stats_counters["resolved"] += 1
+                print(f"🔮 Prefetched stream URL for {item_id} [{quality_index}]")
+            except asyncio.CancelledError:
+                # Only the shared resolution was cancelled (preempted); the worker keeps going
+                if self._stopping:
+                    raise
+            except ResolutionPreempted:
+                # Stopped between bot messages for an interactive request
+                self.stats_counters["preempted"] += 1
+            except Exception as e:
+                self.stats_counters["failed"] += 1
+                print(f"⚠️ Prefetch failed for {item_id}: {e}")
+            finally:
+                self._current = None
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "queued": self._queue.qsize(),
+            "current": self._current,
+            "tokens": round(self.bucket.tokens, 2),
+        }
@@ -0,0 +1,141 @@
+"""
+Rate limiting primitives
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from telethon.errors import FloodWaitError
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available right now"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until tokens are available, then take them"""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """Token bucket that learns a safe rate: additive increase on success,
+    multiplicative decrease (and a full pause) on FloodWait"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 3.0,
+        min_rate: float = 0.05,
+        max_rate: Optional[float] = None,
+        increase: float = 0.01,
+        decrease: float = 0.5,
+    ):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.increase = increase
+        self.decrease = decrease
+        self.paused_until = 0.0
+        self.calls = 0
+        self.waited = 0  # Calls that had to wait for a token
+        self.wait_seconds = 0.0
+        self.flood_waits = 0
+        self.flood_seconds = 0.0
+        self.last_flood_wait = 0.0
+
+    async def acquire(self, tokens: float = 1.0):
+        started = time.monotonic()
+        pause = self.paused_until - started
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await super().acquire(tokens)
+        waited = time.monotonic() - started
+        self.calls += 1
+        if waited > 0.001:
+            self.waited += 1
+            self.wait_seconds += waited
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_flood_wait(self, seconds: float):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.flood_waits += 1
+        self.flood_seconds += seconds
+        self.last_flood_wait = seconds
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "tokens": round(self.tokens, 2),
+            "calls": self.calls,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 2),
+            "flood_waits": self.flood_waits,
+            "flood_seconds": round(self.flood_seconds, 1),
+            "last_flood_wait": self.last_flood_wait,
+            "paused_for": max(0.0, round(self.paused_until - time.monotonic(), 1)),
+        }
+
+
+class BotRateLimiter:
+    """One adaptive bucket per (account, bot) in front of outgoing Telegram calls"""
+
+    def __init__(self, rate: float = 1.0, burst: float = 3.0, max_retry_wait: float = 10.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retry_wait = max_retry_wait  # FloodWaits up to this long are waited out and retried once
+        self.buckets: Dict[Tuple[str, str], AdaptiveTokenBucket] = {}
+
+    def bucket(self, account: str, bot: str) -> AdaptiveTokenBucket:
+        key = (account, bot)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = AdaptiveTokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def call(self, account: str, bot: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() once a token for (account, bot) is available
+
+        FloodWaitError slows the bucket down; short waits are retried once,
+        longer ones are raised for the caller to route around.
+        """
+        bucket = self.bucket(account, bot)
+        for attempt in range(2):
+            await bucket.acquire()
+            try:
+                result = await fn()
+            except FloodWaitError as e:
+                bucket.on_flood_wait(e.seconds)
+                if attempt or e.seconds > self.max_retry_wait:
+                    raise
+                print(f"🌊 FloodWait {e.seconds}s for {bot} on {account}, retrying")
+                continue
+            bucket.on_success()
+            return result
+
+    def stats(self) -> dict:
+        return {f"{account}:{bot}": bucket.stats() for (account, bot), bucket in self.buckets.items()}
@@ -0,0 +1,91 @@
+"""
+Compact cached representations of search bot results
+Keeps only what get_stream_url needs instead of whole Telethon messages
+"""
+from typing import List, Optional, Tuple
+from telethon.tl.types import Message
+from .models import QualityOption
+
+# Buttons with these words are navigation/promotion, not qualities
+SKIP_BUTTON_WORDS = ('update', 'group', 'backup', 'channel', 'next', 'previous')
+
+
+class ButtonRecord:
+    """One inline keyboard button of a result message"""
+    __slots__ = ("label", "url", "data", "row", "col")
+
+    def __init__(self, label: str, url: Optional[str], data: Optional[bytes], row: int, col: int):
+        self.label = label
+        self.url = url
+        self.data = data
+        self.row = row
+        self.col = col
+
+    def to_quality(self) -> QualityOption:
+        if self.url and not self.data:
+            return QualityOption(label=self.label, type="url", value=self.url)
+        return QualityOption(label=self.label, type="callback", value=f"{self.row},{self.col}")
+
+
+class ResultRecord:
+    """Message coordinates, pre-parsed quality buttons and media flags of one search result"""
+    __slots__ = ("chat_id", "message_id", "buttons", "has_document", "has_video")
+
+    def __init__(
+        self,
+        chat_id: int,
+        message_id: int,
+        buttons: Tuple[ButtonRecord, ...],
+        has_document: bool = False,
+        has_video: bool = False,
+    ):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.buttons = buttons
+        self.has_document = has_document
+        self.has_video = has_video
+
+    @classmethod
+    def from_message(cls, message: Message) -> "ResultRecord":
+        return cls(
+            chat_id=message.chat_id,
+            message_id=message.id,
+            buttons=tuple(parse_buttons(message)),
+            has_document=bool(getattr(message, 'document', None)),
+            has_video=bool(getattr(message, 'video', None)),
+        )
+
+    @property
+    def has_file(self) -> bool:
+        return self.has_document or self.has_video
+
+    def qualities(self) -> List[QualityOption]:
+        return [button.to_quality() for button in self.buttons]
+
+
+def parse_buttons(message: Message) -> List[ButtonRecord]:
+    """Parse inline keyboard buttons into quality button records"""
+    records = []
+
+    if not hasattr(message, 'buttons') or not message.buttons:
+        return records
+
+    for i, row in enumerate(message.buttons):
+        for j, btn in enumerate(row):
+            label = getattr(btn, 'text', '').strip()
+            if not label:
+                continue
+
+            # Skip non-quality buttons
+            lower = label.lower()
+            if any(skip in lower for skip in SKIP_BUTTON_WORDS):
+                continue
+
+            url = getattr(btn, 'url', None) or None
+            data = getattr(btn, 'data', None) or None
+            if not (url or data):
+                continue
+
+            records.append(ButtonRecord(label, url, data, i, j))
+
+    return records
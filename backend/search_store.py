@@ -0,0 +1,93 @@
+"""
+Persistent search result store
+Disk tier below TelegramService's in-memory search cache so a restarted
+process answers known queries without a bot conversation
+"""
+import json
+import threading
+import time
+from typing import List, Optional, Tuple
+from .models import SearchResultItem
+from .sqlite_store import open_database
+
+
+class SearchResultStore:
+    """SQLite table of query -> serialized results with the time they were fetched,
+    bounded to max_entries (least recently fetched evicted)"""
+
+    def __init__(self, path: str, max_age: int = 86400, max_entries: int = 5000):
+        self.path = path
+        self.max_age = max_age  # Rows older than this are never served
+        self.max_entries = max_entries
+        self._conn = open_database(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            " query TEXT PRIMARY KEY,"
+            " results TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_fetched ON search_results(fetched_at)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, query: str) -> Optional[Tuple[List[SearchResultItem], float]]:
+        """Return (results, fetched_at) for a normalized query, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, fetched_at FROM search_results WHERE query = ?", (query,)
+            ).fetchone()
+        if not row or time.time() - row[1] >= self.max_age:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        results = [SearchResultItem.model_validate(item) for item in json.loads(row[0])]
+        return results, row[1]
+
+    def put(self, query: str, results: List[SearchResultItem], fetched_at: float):
+        payload = json.dumps([item.model_dump(mode="json") for item in results])
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE search_results SET results = ?, fetched_at = ? WHERE query = ?",
+                (payload, fetched_at, query),
+            )
+            if not cur.rowcount:
+                self._conn.execute(
+                    "INSERT INTO search_results (query, results, fetched_at) VALUES (?, ?, ?)",
+                    (query, payload, fetched_at),
+                )
+                self._count += 1
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM search_results WHERE query IN"
+                    " (SELECT query FROM search_results ORDER BY fetched_at LIMIT ?)",
+                    (overflow,),
+                )
+                self._count -= overflow
+                self.evictions += overflow
+
+    def purge_expired(self) -> int:
+        """Drop rows too old to be served, returning how many were removed"""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM search_results WHERE fetched_at < ?", (time.time() - self.max_age,)
+            )
+            self._count -= cur.rowcount
+            return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_results")
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        return {"entries": self._count, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
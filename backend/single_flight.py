@@ -0,0 +1,66 @@
+"""
+Single-flight request coalescing
+Concurrent calls for the same key share one execution and its result
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; later callers await the same task"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() for key, or join the call already running for it"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            # The work runs in its own task so one caller's cancellation doesn't fail the others
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.coalesced += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def cancel_if_unshared(self, key: Hashable) -> bool:
+        """Cancel the call for key when at most one caller is waiting on it"""
+        task = self._inflight.get(key)
+        if task is None or task.done() or self._waiters.get(key, 0) > 1:
+            return False
+        task.cancel()
+        self.cancelled += 1
+        return True
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved; every waiter re-raises it on its own
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,18 @@
+"""
+SQLite helpers shared by the on-disk caches and stores
+"""
+import os
+import sqlite3
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    """Open (creating parent directories) a WAL-mode SQLite database usable from any thread"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
@@ -0,0 +1,116 @@
+"""
+Persistent cache of resolved stream URLs
+Maps Telegram document ids and (item_id, quality) pairs to the direct link
+returned by the link bot, so repeat requests skip the Telegram pipeline
+"""
+import threading
+import time
+from typing import Iterable, Optional
+from .sqlite_store import open_database
+
+# Returned when the link bot fails; never cached or reused
+DEMO_STREAM_URL = "https://commondatastorage.googleapis.com/gtv-videos-bucket/sample/BigBuckBunny.mp4"
+
+
+def item_key(item_id: str, quality_index: int) -> str:
+    return f"item:{item_id}:{quality_index}"
+
+
+def document_key(document_id: int) -> str:
+    return f"doc:{document_id}"
+
+
+class StreamUrlCache:
+    """SQLite-backed URL cache with a TTL and an entry bound (least recently used evicted)"""
+
+    def __init__(self, path: str, ttl: int = 21600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = open_database(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stream_urls ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_stream_urls_access ON stream_urls(last_access)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM stream_urls").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached URL for key, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, created_at FROM stream_urls WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._conn.execute("UPDATE stream_urls SET last_access = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM stream_urls WHERE key = ?", (key,))
+                self._count -= 1
+            self.misses += 1
+            return None
+
+    def put(self, keys: Iterable[str], url: str):
+        """Store url under every key (e.g. the item key and the document key)"""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO stream_urls (key, url, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, url, now, now),
+                )
+                if cur.rowcount:
+                    self._count += 1
+                else:
+                    self._conn.execute(
+                        "UPDATE stream_urls SET url = ?, created_at = ?, last_access = ? WHERE key = ?",
+                        (url, now, now, key),
+                    )
+                self.stores += 1
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM stream_urls WHERE key IN"
+                    " (SELECT key FROM stream_urls ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self._count -= overflow
+                self.evictions += overflow
+
+    def purge_expired(self) -> int:
+        """Drop expired rows, returning how many were removed"""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM stream_urls WHERE created_at < ?", (time.time() - self.ttl,))
+            self._count -= cur.rowcount
+            return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM stream_urls")
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,79 @@
+"""
+Typeahead suggestions
+Sorted array of normalized title keys searched with bisect, so prefix
+lookups never touch Telegram
+"""
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+from .catalog import normalize_title
+
+
+class SuggestIndex:
+    """Prefix index over known titles and past queries
+
+    Every word boundary of a title is a key, so "endgame" finds
+    "Avengers Endgame" as well as "aven" does.
+    """
+
+    def __init__(self, max_titles: int = 200000):
+        self.max_titles = max_titles
+        self._keys: List[Tuple[str, str]] = []  # (key, normalized title), sorted
+        self._display: Dict[str, str] = {}  # normalized title -> display title
+        self._pending: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._display)
+
+    def add(self, title: str):
+        normalized = normalize_title(title)
+        if not normalized or normalized in self._display or len(self._display) >= self.max_titles:
+            return
+        self._display[normalized] = title.strip()
+        self._pending.add(normalized)
+
+    def add_many(self, titles):
+        for title in titles:
+            self.add(title)
+
+    def _merge_pending(self):
+        """Fold pending titles into the sorted array (one sort for a batch, insort for a few)"""
+        new_keys = [
+            (normalized[i:], normalized)
+            for normalized in self._pending
+            for i in [0] + [pos + 1 for pos, ch in enumerate(normalized) if ch == ' ']
+        ]
+        self._pending.clear()
+        if len(new_keys) > 64:
+            self._keys.extend(new_keys)
+            self._keys.sort()
+        else:
+            for key in new_keys:
+                insort(self._keys, key)
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[str]:
+        """Display titles having a word that starts with prefix, full-title matches first"""
+        if self._pending:
+            self._merge_pending()
+
+        needle = normalize_title(prefix)
+        if not needle:
+            return []
+
+        title_starts: List[str] = []
+        word_starts: List[str] = []
+        seen: Set[str] = set()
+        idx = bisect_left(self._keys, (needle, ""))
+        # Keys are in lexicographic order, so scan a bounded window past the first match
+        while idx < len(self._keys) and len(title_starts) < limit and len(seen) < limit * 4:
+            key, normalized = self._keys[idx]
+            if not key.startswith(needle):
+                break
+            if normalized not in seen:
+                seen.add(normalized)
+                (title_starts if key == normalized else word_starts).append(self._display[normalized])
+            idx += 1
+
+        return (title_starts + word_starts)[:limit]
+
+    def stats(self) -> dict:
+        return {"titles": len(self._display), "keys": len(self._keys) + len(self._pending)}
@@ -3,105 +3,176 @@ Telegram Service Layer
 Handles all Telegram operations using Telethon
 """
 import asyncio
+import contextvars
 import re
 import time
-from typing import List, Optional, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from telethon import TelegramClient, events
 from telethon.tl.types import Message
 from telethon.tl.functions.channels import JoinChannelRequest
-from .models import SearchResultItem, QualityOption
+from .models import SearchResultItem
+from .message_router import MessageRouter, has_file, has_url, extract_url
+from .single_flight import SingleFlight
+from .stream_cache import StreamUrlCache, item_key, document_key, DEMO_STREAM_URL
+from .search_store import SearchResultStore
+from .lru_cache import LRUCache
+from .records import ResultRecord
+from .catalog import TitleCatalog
+from .suggest import SuggestIndex
+from .account_pool import AccountPool, AccountShard
+from .rate_limit import BotRateLimiter
+from telethon.errors import BotResponseTimeoutError, FloodWaitError
+from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+
+# Cache key of the stream resolution running in the current task, if any
+_current_resolution = contextvars.ContextVar("current_resolution", default=None)
+
+
+class ResolutionPreempted(Exception):
+    """A background resolution stopped before its next bot message to let
+    interactive requests use the chat"""
+
+
+def _is_join_request(message: Message) -> bool:
+    """Bot asks us to join its channels before sending the file"""
+    text = (message.text or "").upper()
+    return "JOIN CHANNEL" in text or "BACKUP" in text
+
+
+def _file_or_join_request(message: Message) -> bool:
+    return has_file(message) or _is_join_request(message)
+
+
+def _file_or_start_command(message: Message) -> bool:
+    return has_file(message) or bool(message.text and '/start' in message.text)
+
+
+def _file_or_file_start_command(message: Message) -> bool:
+    return has_file(message) or bool(
+        message.text and '/start' in message.text and 'file_' in message.text.lower()
+    )
 
 
 class TelegramService:
     """Service for Telegram operations"""
     
-    def __init__(self, api_id: int, api_hash: str, search_bot: str, streaming_bot: str):
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        search_bot: str,
+        streaming_bot: str,
+        url_cache: Optional[StreamUrlCache] = None,
+        search_store: Optional[SearchResultStore] = None,
+        cache_ttl: int = 300,
+        stale_ttl: int = 3600,
+        catalog: Optional[TitleCatalog] = None,
+        catalog_max_age: int = 0,
+        catalog_min_score: float = 0.75,
+        session_names: Optional[List[str]] = None,
+        bot_rate: float = 1.0,
+        bot_burst: float = 3.0
+    ):
         self.api_id = api_id
         self.api_hash = api_hash
         self.search_bot = search_bot
         self.streaming_bot = streaming_bot
         self.file_link_bot = "link_generatorr1_bot"  # Bot that generates direct links
-        self.client: Optional[TelegramClient] = None
-        self.message_cache: Dict[str, Message] = {}
-        self.search_cache: Dict[str, tuple] = {}  # Cache search results: query -> (results, timestamp)
-        self.cache_ttl = 300  # Cache for 5 minutes
-        self.lock = asyncio.Lock()
+        # Every outgoing message, fetch, forward and click goes through a per (account, bot) bucket
+        self.rate_limiter = BotRateLimiter(rate=bot_rate, burst=bot_burst)
+        # One client per authorized session; searches spread over them, streams use the owning one
+        self.accounts = AccountPool(
+            api_id, api_hash, session_names, [search_bot, self.file_link_bot], rate_limiter=self.rate_limiter
+        )
+        # (account, bot) -> lock; one search or exchange in flight per bot chat on each account
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        # item_id -> ResultRecord (coordinates + parsed buttons), needed later to click them
+        self.message_cache = LRUCache(
+            max_entries=20000,
+            max_bytes=16 * 1024 * 1024,
+            ttl=6 * 3600
+        )
+        # query -> (results, timestamp); kept through the stale window for stale-while-revalidate
+        self.search_cache = LRUCache(
+            max_entries=500,
+            max_bytes=64 * 1024 * 1024,
+            ttl=cache_ttl + stale_ttl
+        )
+        self.cache_ttl = cache_ttl  # Results younger than this are fresh
+        self.stale_ttl = stale_ttl  # Beyond cache_ttl, served immediately while refreshed in background
+        self.search_store = search_store  # Disk tier below search_cache
+        self._refresh_tasks: set = set()
+        self.catalog = catalog  # Every parsed result, indexed for local lookups
+        self.catalog_max_age = catalog_max_age  # Serve catalog matches seen within this window (0 = never)
+        self.catalog_min_score = catalog_min_score
+        self._catalog_saver: Optional[asyncio.Task] = None
+        self._store_purger: Optional[asyncio.Task] = None
+        self.suggest_index = SuggestIndex()  # Typeahead over known titles and past queries
+        self.url_cache = url_cache  # Resolved stream links, survives restarts
+        self.search_flight = SingleFlight()  # Identical concurrent searches share one bot conversation
+        self.stream_flight = SingleFlight()  # Same for stream resolutions, e.g. a prefetch and a click
+        self.interactive_active = 0  # User-facing searches/streams in flight; prefetch yields to them
+        self._sent_resolutions: set = set()  # Resolutions that have already messaged a bot
+        self._interactive_resolutions: Dict[str, int] = {}  # Resolution -> user-facing requests awaiting it
+        self.stats = {
+            "search_requests": 0,
+            "search_cache_hits": 0,
+            "search_disk_hits": 0,
+            "search_stale_hits": 0,
+            "search_catalog_hits": 0,
+            "search_background_refreshes": 0,
+            "search_coalesced": 0,
+            "search_bot_queries": 0,
+        }
+        self.reply_timeout = 15  # Deadline for the search bot to send a file
+        self.probe_timeout = 5  # Shorter deadline for speculative workarounds
+        self.link_timeout = 20  # Deadline for the link bot to answer with a URL
+    
+    @property
+    def client(self) -> Optional[TelegramClient]:
+        """Client of the default account"""
+        shard = self.accounts.default
+        return shard.client if shard else None
+    
+    @property
+    def router(self) -> Optional[MessageRouter]:
+        """Reply router of the default account"""
+        shard = self.accounts.default
+        return shard.router if shard else None
     
     async def start(self):
-        """Initialize and start Telegram client"""
-        import os
-        
-        # Use admin session directly (we know it exists and is valid)
-        session_name = 'admin_919353589504'
+        """Connect every configured account and start background tasks"""
+        await self.accounts.start()
         
-        if not os.path.exists(f'{session_name}.session'):
-            print(f"⚠️  Session file {session_name}.session not found in {os.getcwd()}")
-            # Try alternative sessions
-            if os.path.exists('prosearch_single.session'):
-                session_name = 'prosearch_single'
-                print(f"✅ Using alternative session: {session_name}.session")
-            else:
-                raise RuntimeError(f"No valid session file found. Please run 'python login.py' first.")
-        else:
-            print(f"✅ Using session file: {session_name}.session")
+        self.message_cache.start_sweeper()
+        self.search_cache.start_sweeper()
         
-        self.client = TelegramClient(session_name, self.api_id, self.api_hash)
+        if self.catalog:
+            await asyncio.to_thread(self.catalog.load)
+            self.suggest_index.add_many(title for _, title in self.catalog.titles())
+            self._catalog_saver = asyncio.create_task(self._save_catalog_periodically())
         
-        # Start client (this will connect and check authorization)
-        await self.client.start()
-        
-        # Verify we're authorized
-        if not await self.client.is_user_authorized():
-            raise RuntimeError("Telegram session not authorized. Run 'python login.py' to authenticate.")
-        
-        me = await self.client.get_me()
-        print(f"✅ Telegram client started and authorized as: {me.first_name}")
+        self._store_purger = asyncio.create_task(self._purge_stores_periodically())
     
     async def stop(self):
         """Stop Telegram client"""
-        if self.client:
-            await self.client.disconnect()
-            print("🔌 Telegram client disconnected")
-    
-    def _parse_buttons(self, message: Message) -> List[QualityOption]:
-        """Parse inline keyboard buttons into quality options"""
-        qualities = []
-        
-        if not hasattr(message, 'buttons') or not message.buttons:
-            return qualities
-        
-        for i, row in enumerate(message.buttons):
-            for j, btn in enumerate(row):
-                label = getattr(btn, 'text', '').strip()
-                if not label:
-                    continue
-                
-                # Skip non-quality buttons
-                lower = label.lower()
-                if any(skip in lower for skip in ['update', 'group', 'backup', 'channel', 'next', 'previous']):
-                    continue
-                
-                # Determine button type
-                has_url = bool(getattr(btn, 'url', None))
-                has_callback = bool(getattr(btn, 'data', None))
-                
-                if not (has_url or has_callback):
-                    continue
-                
-                if has_url and not has_callback:
-                    qualities.append(QualityOption(
-                        label=label,
-                        type="url",
-                        value=btn.url
-                    ))
-                elif has_callback:
-                    qualities.append(QualityOption(
-                        label=label,
-                        type="callback",
-                        value=f"{i},{j}"  # Store row,col for clicking
-                    ))
-        
-        return qualities
+        await self.accounts.stop()
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        self.message_cache.stop_sweeper()
+        self.search_cache.stop_sweeper()
+        if self._catalog_saver:
+            self._catalog_saver.cancel()
+        if self._store_purger:
+            self._store_purger.cancel()
+        if self.catalog:
+            snapshot = self.catalog.snapshot()
+            if snapshot is not None:
+                await asyncio.to_thread(self.catalog.write, snapshot)
+        if self.url_cache:
+            self.url_cache.close()
+        if self.search_store:
+            self.search_store.close()
     
     def _extract_metadata(self, text: str) -> Dict[str, Any]:
         """Extract metadata from bot response text"""
@@ -142,489 +213,627 @@ class TelegramService:
     
     async def search_movie(self, query: str) -> List[SearchResultItem]:
         """Search for movies via search bot with caching"""
-        # Check cache first
+        self.stats["search_requests"] += 1
+        self.interactive_active += 1
+        try:
+            return await self._search_movie(query)
+        finally:
+            self.interactive_active -= 1
+    
+    async def _search_movie(self, query: str) -> List[SearchResultItem]:
+        
+        # Check memory cache first, then the disk tier
         query_lower = query.lower().strip()
-        if query_lower in self.search_cache:
-            cached_results, timestamp = self.search_cache[query_lower]
-            if time.time() - timestamp < self.cache_ttl:
+        cached = self.search_cache.get(query_lower)
+        if cached is None and self.search_store:
+            cached = await asyncio.to_thread(self.search_store.get, query_lower)
+            if cached:
+                self.stats["search_disk_hits"] += 1
+                self.search_cache.set(query_lower, cached)
+                self.suggest_index.add_many(r.title for r in cached[0])
+        
+        if cached:
+            cached_results, timestamp = cached
+            age = time.time() - timestamp
+            if age < self.cache_ttl:
+                self.stats["search_cache_hits"] += 1
                 print(f"✅ Returning cached results for: {query}")
                 return cached_results
+            if age < self.cache_ttl + self.stale_ttl:
+                # Stale-while-revalidate: answer now, refresh in the background
+                self.stats["search_stale_hits"] += 1
+                print(f"♻️ Returning stale results for: {query} (refreshing)")
+                self._refresh_search(query, query_lower)
+                return cached_results
         
-        async with self.lock:
-            if not self.client:
-                raise RuntimeError("Telegram client not started")
-            
-            results = []
+        # Known titles can be answered from the local catalog
+        if self.catalog and self.catalog_max_age:
+            known = self.catalog.lookup(query, min_score=self.catalog_min_score, max_age=self.catalog_max_age)
+            if known:
+                self.stats["search_catalog_hits"] += 1
+                print(f"📚 Returning {len(known)} catalog matches for: {query}")
+                return known
+        
+        # Join an identical search that is already talking to the bot
+        if self.search_flight.in_flight(query_lower):
+            self.stats["search_coalesced"] += 1
+            print(f"🔗 Coalescing with in-flight search for: {query}")
+        return await self.search_flight.do(query_lower, lambda: self._search_bot(query, query_lower))
+    
+    async def _save_catalog_periodically(self, interval: float = 60.0):
+        """Persist the catalog off the event loop whenever it changed"""
+        while True:
+            await asyncio.sleep(interval)
+            snapshot = self.catalog.snapshot()
+            if snapshot is not None:
+                try:
+                    await asyncio.to_thread(self.catalog.write, snapshot)
+                except OSError as e:
+                    print(f"⚠️ Could not save catalog: {e}")
+    
+    async def _purge_stores_periodically(self, interval: float = 3600.0):
+        """Drop expired rows from the on-disk caches, at startup and then every interval"""
+        while True:
+            for name, store in (("stream URLs", self.url_cache), ("search results", self.search_store)):
+                if not store:
+                    continue
+                try:
+                    purged = await asyncio.to_thread(store.purge_expired)
+                    if purged:
+                        print(f"🧹 Purged {purged} expired {name}")
+                except Exception as e:
+                    print(f"⚠️ Could not purge {name}: {e}")
+            await asyncio.sleep(interval)
+    
+    def _refresh_search(self, query: str, query_lower: str):
+        """Re-run a search in the background unless one is already in flight"""
+        if self.search_flight.in_flight(query_lower):
+            return
+        self.stats["search_background_refreshes"] += 1
+        task = asyncio.create_task(self.search_flight.do(query_lower, lambda: self._search_bot(query, query_lower)))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._on_refresh_done)
+    
+    def _on_refresh_done(self, task: asyncio.Task):
+        self._refresh_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"⚠️ Background search refresh failed: {task.exception()}")
+    
+    async def _search_bot(self, query: str, query_lower: str) -> List[SearchResultItem]:
+        """Run one search conversation on the least-loaded account, moving to
+        another account if this one hits a FloodWait"""
+        shard = self.accounts.pick()
+        try:
+            return await self._search_bot_on(shard, query, query_lower)
+        except FloodWaitError as e:
+            shard.mark_flood(e.seconds)
+            retry = self.accounts.pick(exclude=shard)
+            if retry is shard or not retry.available:
+                raise
+            print(f"🔀 Retrying search on account {retry.name}")
+            return await self._search_bot_on(retry, query, query_lower)
+    
+    async def _search_bot_on(self, shard: AccountShard, query: str, query_lower: str) -> List[SearchResultItem]:
+        """Run one search conversation with the bot and cache its results"""
+        with shard.busy():
+            # Replies can't be told apart from each other's, so everything on this bot chat takes turns
+            async with self._lock(shard, self.search_bot):
+                results = []
             
-            try:
-                async with self.client.conversation(self.search_bot, timeout=60) as conv:
-                    # Send search query
-                    await conv.send_message(query)
-                    print(f"🔎 Sent query: {query}")
+                try:
+                    async with shard.client.conversation(self.search_bot, timeout=60) as conv:
+                        # Send search query
+                        self.stats["search_bot_queries"] += 1
+                        await self.rate_limiter.call(shard.name, self.search_bot, lambda: conv.send_message(query))
+                        print(f"🔎 Sent query: {query}")
                     
-                    # Wait for responses with optimized timeouts
-                    replies = []
-                    first = await conv.get_response()
-                    replies.append(first)
+                        # Wait for responses with optimized timeouts
+                        replies = []
+                        first = await conv.get_response()
+                        replies.append(first)
                     
-                    # Collect additional messages with shorter timeout and max limit
-                    max_messages = 10  # Limit to first 10 results for speed
-                    while len(replies) < max_messages:
-                        try:
-                            # Reduced timeout from 3s to 1s for faster response
-                            nxt = await conv.get_response(timeout=1)
-                            replies.append(nxt)
-                            # Early termination if we have enough results with buttons
-                            if len([r for r in replies if hasattr(r, 'buttons') and r.buttons]) >= 5:
-                                print(f"⚡ Early termination: found {len(replies)} messages with 5+ results")
+                        # Collect additional messages with shorter timeout and max limit
+                        max_messages = 10  # Limit to first 10 results for speed
+                        while len(replies) < max_messages:
+                            try:
+                                # Reduced timeout from 3s to 1s for faster response
+                                nxt = await conv.get_response(timeout=1)
+                                replies.append(nxt)
+                                # Early termination if we have enough results with buttons
+                                if len([r for r in replies if hasattr(r, 'buttons') and r.buttons]) >= 5:
+                                    print(f"⚡ Early termination: found {len(replies)} messages with 5+ results")
+                                    break
+                            except asyncio.TimeoutError:
                                 break
-                        except asyncio.TimeoutError:
-                            break
                     
-                    print(f"📨 Received {len(replies)} messages")
+                        print(f"📨 Received {len(replies)} messages")
                     
-                    # Process messages with buttons
-                    for msg in replies:
-                        if not hasattr(msg, 'buttons') or not msg.buttons:
-                            continue
+                        # Process messages with buttons
+                        for msg in replies:
+                            if not hasattr(msg, 'buttons') or not msg.buttons:
+                                continue
                         
-                        # Parse qualities from buttons
-                        qualities = self._parse_buttons(msg)
-                        if not qualities:
-                            continue
+                            # Parse buttons once into a compact record
+                            record = ResultRecord.from_message(msg)
+                            if not record.buttons:
+                                continue
+                            qualities = record.qualities()
                         
-                        # Extract metadata from message text
-                        metadata = self._extract_metadata(msg.text or "")
+                            # Extract metadata from message text
+                            metadata = self._extract_metadata(msg.text or "")
                         
-                        # Generate unique ID
-                        item_id = f"msg_{msg.chat_id}_{msg.id}"
+                            # Generate unique ID; message ids are per account, so it names the account too
+                            item_id = f"msg_{msg.chat_id}_{msg.id}@{shard.name}"
                         
-                        # Cache message for later use
-                        self.message_cache[item_id] = msg
+                            # Cache the compact record for later clicks
+                            self.message_cache.set(item_id, record)
                         
-                        # Create result item
-                        result = SearchResultItem(
-                            id=item_id,
-                            title=metadata['title'] or f"Result {len(results) + 1}",
-                            snippet=msg.text[:200] if msg.text else None,
-                            year=metadata['year'],
-                            imdb_rating=metadata['imdb_rating'],
-                            genre=metadata['genre'] if metadata['genre'] else None,
-                            qualities=qualities,
-                            message_chat_id=msg.chat_id,
-                            message_id=msg.id
-                        )
+                            # Create result item
+                            result = SearchResultItem(
+                                id=item_id,
+                                title=metadata['title'] or f"Result {len(results) + 1}",
+                                snippet=msg.text[:200] if msg.text else None,
+                                year=metadata['year'],
+                                imdb_rating=metadata['imdb_rating'],
+                                genre=metadata['genre'] if metadata['genre'] else None,
+                                qualities=qualities,
+                                message_chat_id=msg.chat_id,
+                                message_id=msg.id
+                            )
                         
-                        results.append(result)
-                
-                print(f"✅ Found {len(results)} results")
+                            results.append(result)
                 
-                # Cache the results
-                self.search_cache[query_lower] = (results, time.time())
+                    print(f"✅ Found {len(results)} results")
                 
-                # Limit cache size to prevent memory issues
-                if len(self.search_cache) > 100:
-                    # Remove oldest entries
-                    oldest_key = min(self.search_cache.keys(), key=lambda k: self.search_cache[k][1])
-                    del self.search_cache[oldest_key]
+                    # Cache the results
+                    fetched_at = time.time()
+                    self.search_cache.set(query_lower, (results, fetched_at))
+                    if self.search_store:
+                        await asyncio.to_thread(self.search_store.put, query_lower, results, fetched_at)
+                    if self.catalog:
+                        self.catalog.add_many(results, fetched_at)
+                    if results:
+                        self.suggest_index.add(query)
+                        self.suggest_index.add_many(r.title for r in results)
                 
-                return results
+                    return results
             
-            except Exception as e:
-                print(f"❌ Search failed: {e}")
+                except Exception as e:
+                    print(f"❌ Search failed: {e}")
+                    raise
+    
+    async def get_cached_stream_url(self, item_id: str, quality_index: int) -> Optional[str]:
+        """Stream URL from the persistent cache, without any Telegram work"""
+        if not self.url_cache:
+            return None
+        return await asyncio.to_thread(self.url_cache.get, item_key(item_id, quality_index))
+    
+    async def get_stream_url(self, item_id: str, quality_index: int, interactive: bool = True) -> str:
+        """Get streaming URL, from the persistent cache when possible
+        
+        Concurrent requests for the same item and quality (including a
+        prefetch) share one resolution.
+        """
+        cached_url = await self.get_cached_stream_url(item_id, quality_index)
+        if cached_url:
+            print(f"✅ Returning cached stream URL for {item_id} [{quality_index}]")
+            return cached_url
+        
+        cache_key = item_key(item_id, quality_index)
+        if interactive:
+            self.interactive_active += 1
+            self._interactive_resolutions[cache_key] = self._interactive_resolutions.get(cache_key, 0) + 1
+        try:
+            return await self.stream_flight.do(
+                cache_key, lambda: self._resolve_and_cache(item_id, quality_index, cache_key)
+            )
+        finally:
+            if interactive:
+                self.interactive_active -= 1
+                self._interactive_resolutions[cache_key] -= 1
+                if not self._interactive_resolutions[cache_key]:
+                    del self._interactive_resolutions[cache_key]
+    
+    def resolution_sent(self, cache_key: str) -> bool:
+        """Whether the resolution for cache_key has already sent something to a bot
+        
+        Cancelling it after that point would leave the bot's reply behind for
+        the next exchange on that chat to pick up.
+        """
+        return cache_key in self._sent_resolutions
+    
+    async def _resolve_and_cache(self, item_id: str, quality_index: int, cache_key: str) -> str:
+        token = _current_resolution.set(cache_key)
+        try:
+            url = await self._resolve_stream_url(item_id, quality_index)
+        finally:
+            _current_resolution.reset(token)
+            self._sent_resolutions.discard(cache_key)
+        if self.url_cache and url != DEMO_STREAM_URL:
+            await asyncio.to_thread(self.url_cache.put, [cache_key], url)
+        return url
+    
+    @staticmethod
+    def _parse_item_id(item_id: str):
+        """Split msg_{chat_id}_{message_id}[@{account}] into (account or None, chat_id, message_id)"""
+        coords, _, account = item_id.partition('@')
+        parts = coords.split('_')
+        if len(parts) != 3 or parts[0] != 'msg':
+            raise ValueError(f"Invalid item_id format: {item_id}")
+        return account or None, int(parts[1]), int(parts[2])
+    
+    async def _resolve_stream_url(self, item_id: str, quality_index: int) -> str:
+        """Get streaming URL on the account that found the item"""
+        account, _, _ = self._parse_item_id(item_id)
+        shard = self.accounts.get(account)
+        if not shard.available:
+            # Message ids only exist for this account, so sit out its FloodWait
+            wait = shard.flood_until - time.monotonic()
+            print(f"⏳ Account {shard.name} in FloodWait, waiting {wait:.0f}s")
+            await asyncio.sleep(wait)
+        
+        with shard.busy():
+            try:
+                return await self._resolve_stream_url_on(shard, item_id, quality_index)
+            except FloodWaitError as e:
+                shard.mark_flood(e.seconds)
                 raise
     
-    async def get_stream_url(self, item_id: str, quality_index: int) -> str:
+    async def _resolve_stream_url_on(self, shard: AccountShard, item_id: str, quality_index: int) -> str:
         """Get streaming URL by clicking quality button and forwarding to streamer"""
-        async with self.lock:
-            if not self.client:
-                raise RuntimeError("Telegram client not started")
-            
-            # Get cached message
-            if item_id not in self.message_cache:
-                # Try to retrieve the message from Telegram using the ID
-                print(f"⚠️ Item {item_id} not in cache, attempting to retrieve from Telegram...")
-                try:
-                    # Parse item_id format: msg_{chat_id}_{message_id}
-                    parts = item_id.split('_')
-                    if len(parts) == 3 and parts[0] == 'msg':
-                        chat_id = int(parts[1])
-                        message_id = int(parts[2])
-                        
-                        # Retrieve message from Telegram
-                        message = await self.client.get_messages(chat_id, ids=message_id)
-                        if not message:
-                            raise ValueError(f"Could not retrieve message {message_id} from chat {chat_id}")
-                        
-                        # Cache it for future use
-                        self.message_cache[item_id] = message
-                        print(f"✅ Retrieved and cached message {item_id}")
-                    else:
-                        raise ValueError(f"Invalid item_id format: {item_id}")
-                except Exception as e:
-                    print(f"❌ Failed to retrieve message: {e}")
-                    raise ValueError(f"Item {item_id} not found in cache and could not be retrieved: {str(e)}")
-            else:
-                message = self.message_cache[item_id]
-            
-            # Parse buttons
-            qualities = self._parse_buttons(message)
-            if quality_index >= len(qualities):
-                raise ValueError(f"Quality index {quality_index} out of range")
-            
-            quality = qualities[quality_index]
-            print(f"🎯 Selected quality: {quality.label}")
+        # Get cached result record
+        record = self.message_cache.get(item_id)
+        if record is None:
+            # Try to retrieve the message from Telegram using the ID
+            print(f"⚠️ Item {item_id} not in cache, attempting to retrieve from Telegram...")
+            try:
+                _, chat_id, message_id = self._parse_item_id(item_id)
+                
+                # Retrieve message from Telegram
+                message = await self._get_message(shard, chat_id, message_id)
+                if not message:
+                    raise ValueError(f"Could not retrieve message {message_id} from chat {chat_id}")
+                
+                # Cache it for future use
+                record = ResultRecord.from_message(message)
+                self.message_cache.set(item_id, record)
+                print(f"✅ Retrieved and cached message {item_id}")
+            except Exception as e:
+                print(f"❌ Failed to retrieve message: {e}")
+                raise ValueError(f"Item {item_id} not found in cache and could not be retrieved: {str(e)}")
+        
+        # Buttons were parsed when the record was built
+        if quality_index >= len(record.buttons):
+            raise ValueError(f"Quality index {quality_index} out of range")
+        
+        button = record.buttons[quality_index]
+        quality = button.to_quality()
+        print(f"🎯 Selected quality: {quality.label}")
+        
+        # Fast path: the result message itself carries the file
+        if record.has_file:
+            print("🚀 FAST PATH: Message has file, using directly!")
+            try:
+                message = await self._get_message(shard, record.chat_id, record.message_id)
+                return await self._forward_and_get_url(shard, message)
+            except Exception as e:
+                print(f"⚠️ Fast path failed: {e}")
+        
+        try:
+            # Handle different button types
+            if quality.type == "url":
+                # Direct URL - check if it's a /start link
+                url = quality.value
+                if "start=" in url:
+                    # Extract start payload and send to bot
+                    start_payload = "/start " + url.split("start=")[1]
+                    file_msg = await self._send_and_wait_for_file(shard, start_payload)
+                    if file_msg:
+                        return await self._forward_and_get_url(shard, file_msg)
+                    
+                    raise RuntimeError("No file found after /start command")
+                else:
+                    # Direct streaming URL
+                    return url
             
-            # AGGRESSIVE WORKAROUND: Check if message has file
-            if hasattr(message, 'document') or hasattr(message, 'video'):
-                print("🚀 FAST PATH: Message has file, using directly!")
+            elif quality.type == "callback":
+                # Click callback button
+                row, col = map(int, quality.value.split(','))
+                
+                print(f"🎯 Handling callback button at row={row}, col={col}")
+                print(f"📝 Quality label: {quality.label}")
+                
+                # WORKAROUND: Try sending quality text as message first
+                # This often bypasses channel verification
+                print(f"📤 WORKAROUND: Sending quality text '{quality.label}' as message...")
                 try:
-                    return await self._forward_and_get_url(message)
+                    file_msg = await self._send_and_wait_for_file(shard, quality.label, timeout=self.probe_timeout)
+                    if file_msg:
+                        print("✅ Got file from text message workaround!")
+                        return await self._forward_and_get_url(shard, file_msg)
+                    print("⚠️ Text message didn't work, trying button click...")
                 except Exception as e:
-                    print(f"⚠️ Fast path failed: {e}")
-            
-            try:
-                # Handle different button types
-                if quality.type == "url":
-                    # Direct URL - check if it's a /start link
-                    url = quality.value
-                    if "start=" in url:
-                        # Extract start payload and send to bot
-                        start_payload = "/start " + url.split("start=")[1]
-                        await self.client.send_message(self.search_bot, start_payload)
-                        await asyncio.sleep(3)
-                        
-                        # Get recent messages to find file
-                        msgs = await self.client.get_messages(self.search_bot, limit=10)
-                        for m in msgs:
-                            if hasattr(m, 'document') or hasattr(m, 'video'):
-                                return await self._forward_and_get_url(m)
-                        
-                        raise RuntimeError("No file found after /start command")
-                    else:
-                        # Direct streaming URL
-                        return url
+                    print(f"⚠️ Text message failed: {e}")
                 
-                elif quality.type == "callback":
-                    # Click callback button
-                    row, col = map(int, quality.value.split(','))
-                    
-                    print(f"🎯 Handling callback button at row={row}, col={col}")
-                    print(f"📝 Quality label: {quality.label}")
+                # Check whether the button also carries a URL
+                button_url = button.url
+                if button_url:
+                    print(f"📎 Button has URL: {button_url}")
+                
+                # If button has a URL with /start, use it directly
+                if button_url and 'start=' in button_url:
+                    print(f"🚀 Using direct /start approach instead of clicking")
+                    start_param = button_url.split('start=')[1].split('&')[0]
+                    start_cmd = f"/start {start_param}"
+                    print(f"📤 Sending: {start_cmd}")
                     
-                    # WORKAROUND: Try sending quality text as message first
-                    # This often bypasses channel verification
-                    print(f"📤 WORKAROUND: Sending quality text '{quality.label}' as message...")
-                    try:
-                        await self.client.send_message(self.search_bot, quality.label)
-                        await asyncio.sleep(5)
-                        
-                        # Check for file response
-                        msgs = await self.client.get_messages(self.search_bot, limit=10)
-                        for m in msgs:
-                            if hasattr(m, 'document') or hasattr(m, 'video'):
-                                print("✅ Got file from text message workaround!")
-                                return await self._forward_and_get_url(m)
-                        print("⚠️ Text message didn't work, trying button click...")
-                    except Exception as e:
-                        print(f"⚠️ Text message failed: {e}")
+                    print("⏳ Waiting for bot response...")
+                    reply = await self._exchange(
+                        shard, self.search_bot, lambda: self._send(shard, self.search_bot, start_cmd),
+                        _file_or_join_request
+                    )
                     
-                    # Get the actual button to check if it has a URL
-                    button_url = None
-                    if hasattr(message, 'buttons') and message.buttons:
-                        try:
-                            btn = message.buttons[row][col]
-                            if hasattr(btn, 'url') and btn.url:
-                                button_url = btn.url
-                                print(f"📎 Button has URL: {button_url}")
-                        except (IndexError, AttributeError) as e:
-                            print(f"⚠️ Could not get button URL: {e}")
+                    if reply and has_file(reply):
+                        print("✅ Found file after /start command!")
+                        return await self._forward_and_get_url(shard, reply)
                     
-                    # If button has a URL with /start, use it directly
-                    if button_url and 'start=' in button_url:
-                        print(f"🚀 Using direct /start approach instead of clicking")
-                        start_param = button_url.split('start=')[1].split('&')[0]
-                        start_cmd = f"/start {start_param}"
-                        print(f"📤 Sending: {start_cmd}")
-                        
-                        await self.client.send_message(self.search_bot, start_cmd)
-                        print("⏳ Waiting for bot response...")
-                        await asyncio.sleep(6)
+                    if reply:
+                        print(f"📝 Message text: {reply.text[:100]}...")
+                        print("⚠️ Bot still requires channel join after /start")
+                        await self._join_channels_from(shard, reply)
                         
-                        # Check for file or channel join request
-                        msgs = await self.client.get_messages(self.search_bot, limit=15)
-                        print(f"📋 Got {len(msgs)} messages after /start")
+                        # Try clicking Try Again or re-sending /start
+                        file_msg = await self._click_try_again(shard, reply)
+                        if file_msg:
+                            print("✅ Found file after Try Again!")
+                            return await self._forward_and_get_url(shard, file_msg)
                         
-                        # First pass: look for files
-                        for m in msgs:
-                            if hasattr(m, 'document') or hasattr(m, 'video'):
-                                print("✅ Found file after /start command!")
-                                return await self._forward_and_get_url(m)
-                        
-                        # Second pass: check for channel join or Try Again
-                        for m in msgs:
-                            if m.text:
-                                print(f"📝 Message text: {m.text[:100]}...")
-                                
-                                # Check for channel join requirement
-                                if "JOIN CHANNEL" in m.text.upper() or "BACKUP" in m.text.upper():
-                                    print("⚠️ Bot still requires channel join after /start")
-                                    
-                                    # Join channels
-                                    if hasattr(m, 'buttons') and m.buttons:
-                                        for button_row in m.buttons:
-                                            for btn in button_row:
-                                                if hasattr(btn, 'url') and btn.url and 't.me/' in btn.url:
-                                                    channel = btn.url.split('t.me/')[-1].split('?')[0]
-                                                    try:
-                                                        print(f"🔗 Joining: {channel}")
-                                                        entity = await self.client.get_entity(channel)
-                                                        await self.client(JoinChannelRequest(entity))
-                                                        await asyncio.sleep(2)
-                                                    except Exception as e:
-                                                        print(f"⚠️ Join failed: {e}")
-                                        
-                                        # Try clicking Try Again or re-sending /start
-                                        for button_row in m.buttons:
-                                            for btn in button_row:
-                                                if btn.text and "TRY AGAIN" in btn.text.upper():
-                                                    print("🔄 Clicking Try Again after channel join...")
-                                                    try:
-                                                        await m.click(text=btn.text)
-                                                        await asyncio.sleep(5)
-                                                        
-                                                        # Check for file again
-                                                        new_msgs = await self.client.get_messages(self.search_bot, limit=10)
-                                                        for nm in new_msgs:
-                                                            if hasattr(nm, 'document') or hasattr(nm, 'video'):
-                                                                print("✅ Found file after Try Again!")
-                                                                return await self._forward_and_get_url(nm)
-                                                    except Exception as e:
-                                                        print(f"⚠️ Try Again failed: {e}")
-                                    
-                                    # Re-send /start command after joining
-                                    print(f"🔄 Re-sending /start after channel join...")
-                                    await self.client.send_message(self.search_bot, start_cmd)
-                                    await asyncio.sleep(5)
-                                    
-                                    final_msgs = await self.client.get_messages(self.search_bot, limit=10)
-                                    for fm in final_msgs:
-                                        if hasattr(fm, 'document') or hasattr(fm, 'video'):
-                                            print("✅ Found file after re-sending /start!")
-                                            return await self._forward_and_get_url(fm)
-                        
-                        print("⚠️ No file after /start approach, trying button click...")
+                        # Re-send /start command after joining
+                        print(f"🔄 Re-sending /start after channel join...")
+                        file_msg = await self._send_and_wait_for_file(shard, start_cmd)
+                        if file_msg:
+                            print("✅ Found file after re-sending /start!")
+                            return await self._forward_and_get_url(shard, file_msg)
                     
-                    # Try button click as fallback
+                    print("⚠️ No file after /start approach, trying button click...")
+                
+                # Try button click as fallback
+                async def click():
                     try:
-                        result = await message.click(i=row, j=col)
+                        await self._click(shard, record, button)
                         print(f"✅ Button clicked successfully")
                     except Exception as click_error:
                         print(f"⚠️ Button click failed: {click_error}")
-                        result = None
-                    
-                    # Wait for bot response (might be channel join request or file)
-                    await asyncio.sleep(3)
-                    
-                    # Get recent messages to check for responses
-                    msgs = await self.client.get_messages(self.search_bot, limit=5)
+                
+                # Wait for bot response (might be channel join request or file)
+                after_id = shard.router.last_id(self.search_bot)
+                reply = await self._exchange(shard, self.search_bot, click, _file_or_join_request)
+                
+                if reply and has_file(reply):
+                    print("✅ Found file in bot response")
+                    return await self._forward_and_get_url(shard, reply)
+                
+                if reply:
+                    print("⚠️ Bot requires channel join - attempting to join channels...")
+                    await self._join_channels_from(shard, reply)
                     
-                    print(f"📋 Checking {len(msgs)} recent messages for files or commands...")
-                    for idx, msg in enumerate(msgs):
-                        has_doc = hasattr(msg, 'document') and msg.document
-                        has_video = hasattr(msg, 'video') and msg.video
-                        has_text = msg.text if hasattr(msg, 'text') else None
-                        print(f"  Message {idx}: doc={has_doc}, video={has_video}, text={has_text[:50] if has_text else 'None'}...")
+                    # After joining channels, re-click the ORIGINAL quality button
+                    print("🔄 Re-clicking original quality button after channel join...")
+                    after_id = shard.router.last_id(self.search_bot)
+                    try:
+                        file_msg = await self._exchange(
+                            shard, self.search_bot, lambda: self._click(shard, record, button), has_file
+                        )
+                        print("✅ Re-clicked quality button successfully")
+                        if file_msg:
+                            print("✅ Found file after re-click!")
+                            return await self._forward_and_get_url(shard, file_msg)
+                    except Exception as e:
+                        print(f"⚠️ Re-click failed: {e}")
                     
-                    for m in msgs:
-                        # Check if bot is asking to join a channel
-                        if m.text and ("JOIN CHANNEL" in m.text.upper() or "BACKUP CHANNEL" in m.text.upper()):
-                            print("⚠️ Bot requires channel join - attempting to join channels...")
-                            
-                            # Look for channel join buttons
-                            if hasattr(m, 'buttons') and m.buttons:
-                                for button_row in m.buttons:
-                                    for btn in button_row:
-                                        if hasattr(btn, 'url') and btn.url:
-                                            # Extract channel username from URL
-                                            if 't.me/' in btn.url:
-                                                channel = btn.url.split('t.me/')[-1].split('?')[0]
-                                                try:
-                                                    print(f"🔗 Joining channel: {channel}")
-                                                    # Use get_entity and join
-                                                    entity = await self.client.get_entity(channel)
-                                                    await self.client(JoinChannelRequest(entity))
-                                                    print(f"✅ Joined {channel}")
-                                                    await asyncio.sleep(2)
-                                                except Exception as e:
-                                                    print(f"⚠️ Could not join {channel}: {e}")
-                            
-                            # After joining channels, re-click the ORIGINAL quality button
-                            print("🔄 Re-clicking original quality button after channel join...")
-                            try:
-                                await message.click(i=row, j=col)
-                                print("✅ Re-clicked quality button successfully")
-                                await asyncio.sleep(5)  # Wait for file
-                            except Exception as e:
-                                print(f"⚠️ Re-click failed: {e}")
-                            
-                            # Also click "Try Again" button if available
-                            if hasattr(m, 'buttons') and m.buttons:
-                                for button_row in m.buttons:
-                                    for btn in button_row:
-                                        if btn.text and "TRY AGAIN" in btn.text.upper():
-                                            print("🔄 Also clicking 'Try Again' button...")
-                                            try:
-                                                await m.click(text=btn.text)
-                                                print("⏳ Waiting for file after Try Again...")
-                                                await asyncio.sleep(5)  # Wait longer
-                                                
-                                                # Check for file in newer messages
-                                                new_msgs = await self.client.get_messages(self.search_bot, limit=15)
-                                                for new_m in new_msgs:
-                                                    # Check for /start command
-                                                    if new_m.text and '/start' in new_m.text:
-                                                        print(f"📤 Found /start command, executing...")
-                                                        await self.client.send_message(self.search_bot, new_m.text)
-                                                        await asyncio.sleep(4)
-                                                        
-                                                        # Get messages after /start
-                                                        start_msgs = await self.client.get_messages(self.search_bot, limit=10)
-                                                        for start_m in start_msgs:
-                                                            if hasattr(start_m, 'document') or hasattr(start_m, 'video'):
-                                                                print("✅ Found file after /start command!")
-                                                                return await self._forward_and_get_url(start_m)
-                                                    
-                                                    # Check for direct file
-                                                    if hasattr(new_m, 'document') or hasattr(new_m, 'video'):
-                                                        print("✅ Found file after Try Again!")
-                                                        return await self._forward_and_get_url(new_m)
-                                                
-                                            except Exception as e:
-                                                print(f"⚠️ Try Again click failed: {e}")
-                            break
+                    # Also click "Try Again" button if available
+                    file_msg = await self._click_try_again(shard, reply, follow_start=True)
+                    if file_msg:
+                        print("✅ Found file after Try Again!")
+                        return await self._forward_and_get_url(shard, file_msg)
+                
+                # If still no file, do a final check for a late file or a /start command
+                print("🔍 Final check: Waiting for a file or /start command...")
+                final_m = await self._wait_for_reply(shard, after_id, _file_or_file_start_command, timeout=self.probe_timeout)
+                if final_m and has_file(final_m):
+                    print("✅ Found file in final check!")
+                    return await self._forward_and_get_url(shard, final_m)
+                if final_m:
+                    print(f"📤 Executing final /start command: {final_m.text[:50]}...")
+                    file_msg = await self._send_and_wait_for_file(shard, final_m.text)
+                    if file_msg:
+                        print("✅ Found file after final /start!")
+                        return await self._forward_and_get_url(shard, file_msg)
+                
+                # CRITICAL FIX: Get file from search bot and forward to @link_generatorr1_bot
+                print("🔧 CRITICAL: Attempting to get file from search bot...")
+                
+                # Try to click the /start link to get the file
+                if button.url and 'start=' in button.url:
+                    try:
+                        print(f"📎 Button URL: {button.url}")
+                        file_ref = button.url.split('start=')[1].split('&')[0]
+                        print(f"✅ Extracted file reference: {file_ref}")
                         
-                        # Check for file in response
-                        if hasattr(m, 'document') or hasattr(m, 'video'):
-                            print("✅ Found file in bot response")
-                            return await self._forward_and_get_url(m)
-                    
-                    # If still no file, do a final comprehensive check
-                    print("🔍 Final check: Looking for file in all recent messages...")
-                    await asyncio.sleep(3)
-                    final_msgs = await self.client.get_messages(self.search_bot, limit=20)
-                    
-                    for final_m in final_msgs:
-                        # Look for /start commands first
-                        if final_m.text and '/start' in final_m.text and 'file_' in final_m.text.lower():
-                            print(f"📤 Executing final /start command: {final_m.text[:50]}...")
-                            await self.client.send_message(self.search_bot, final_m.text)
-                            await asyncio.sleep(4)
-                            
-                            # Check for file after /start
-                            post_start_msgs = await self.client.get_messages(self.search_bot, limit=10)
-                            for ps_m in post_start_msgs:
-                                if hasattr(ps_m, 'document') or hasattr(ps_m, 'video'):
-                                    print("✅ Found file after final /start!")
-                                    return await self._forward_and_get_url(ps_m)
+                        # Send /start command to search bot
+                        start_cmd = f"/start {file_ref}"
+                        print(f"📤 Sending to search bot: {start_cmd}")
+                        file_message = await self._send_and_wait_for_file(shard, start_cmd)
                         
-                        # Check for direct file
-                        if hasattr(final_m, 'document') or hasattr(final_m, 'video'):
-                            print("✅ Found file in final check!")
-                            return await self._forward_and_get_url(final_m)
-                    
-                    # CRITICAL FIX: Get file from search bot and forward to @link_generatorr1_bot
-                    print("🔧 CRITICAL: Attempting to get file from search bot...")
-                    
-                    # Try to click the /start link to get the file
-                    if hasattr(message, 'buttons') and message.buttons:
-                        try:
-                            row, col = map(int, quality.value.split(','))
-                            btn = message.buttons[row][col]
-                            
-                            if hasattr(btn, 'url') and btn.url and 'start=' in btn.url:
-                                print(f"📎 Button URL: {btn.url}")
-                                file_ref = btn.url.split('start=')[1].split('&')[0]
-                                print(f"✅ Extracted file reference: {file_ref}")
-                                
-                                # Send /start command to search bot
-                                start_cmd = f"/start {file_ref}"
-                                print(f"📤 Sending to search bot: {start_cmd}")
-                                await self.client.send_message(self.search_bot, start_cmd)
-                                await asyncio.sleep(5)
-                                
-                                # Check if we got a file
-                                recent_msgs = await self.client.get_messages(self.search_bot, limit=15)
-                                file_message = None
-                                
-                                for rm in recent_msgs:
-                                    if hasattr(rm, 'document') or hasattr(rm, 'video'):
-                                        print("✅ Found file from search bot!")
-                                        file_message = rm
-                                        break
-                                
-                                if file_message:
-                                    # Forward the actual file to @link_generatorr1_bot
-                                    print(f"🚀 Forwarding file to @{self.file_link_bot}...")
-                                    return await self._forward_and_get_url(file_message)
-                                else:
-                                    print("⚠️ Search bot didn't send file, trying direct file reference...")
-                                    # Try sending file reference directly
-                                    await self.client.send_message(self.file_link_bot, file_ref)
-                                    await asyncio.sleep(6)
-                                    
-                                    msgs = await self.client.get_messages(self.file_link_bot, limit=10)
-                                    for m in msgs:
-                                        if m.text:
-                                            print(f"📝 Link bot response: {m.text[:150]}...")
-                                            import re
-                                            url_pattern = r'(https?://[^\s]+)'
-                                            urls = re.findall(url_pattern, m.text)
-                                            if urls:
-                                                direct_link = urls[0].strip()
-                                                print(f"✅ GOT DIRECT LINK: {direct_link}")
-                                                return direct_link
-                        except Exception as e:
-                            print(f"⚠️ File extraction failed: {e}")
-                    
-                    raise RuntimeError("No file received after button click. Bot may require manual verification or different quality selection.")
-            
-            except Exception as e:
-                print(f"❌ Failed to get stream URL: {e}")
-                raise
+                        if file_message:
+                            # Forward the actual file to @link_generatorr1_bot
+                            print("✅ Found file from search bot!")
+                            print(f"🚀 Forwarding file to @{self.file_link_bot}...")
+                            return await self._forward_and_get_url(shard, file_message)
+                        else:
+                            print("⚠️ Search bot didn't send file, trying direct file reference...")
+                            # Try sending file reference directly
+                            return await self._get_file_link_from_bot(shard, file_ref)
+                    except Exception as e:
+                        print(f"⚠️ File extraction failed: {e}")
+                
+                raise RuntimeError("No file received after button click. Bot may require manual verification or different quality selection.")
+        
+        except Exception as e:
+            print(f"❌ Failed to get stream URL: {e}")
+            raise
+
+    async def _send(self, shard: AccountShard, bot: str, text: str) -> Message:
+        """Rate-limited send_message to a bot"""
+        return await self.rate_limiter.call(shard.name, bot, lambda: shard.client.send_message(bot, text))
+    
+    async def _get_message(self, shard: AccountShard, chat_id: int, message_id: int) -> Optional[Message]:
+        """Rate-limited fetch of one search bot message"""
+        return await self.rate_limiter.call(
+            shard.name, self.search_bot, lambda: shard.client.get_messages(chat_id, ids=message_id)
+        )
+    
+    async def _click(self, shard: AccountShard, record: ResultRecord, button):
+        """Press a callback button straight from the cached record, without the original message"""
+        if not button.data:
+            return None
+        peer = await shard.client.get_input_entity(record.chat_id)
+        try:
+            return await self.rate_limiter.call(shard.name, self.search_bot, lambda: shard.client(
+                GetBotCallbackAnswerRequest(peer=peer, msg_id=record.message_id, data=button.data)
+            ))
+        except BotResponseTimeoutError:
+            # The bot didn't answer the callback query itself; its reply still arrives as a message
+            return None
+    
+    def _lock(self, shard: AccountShard, bot: str) -> asyncio.Lock:
+        """Lock for exclusive use of a bot chat on one account"""
+        key = (shard.name, bot)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+    
+    async def _exchange(
+        self,
+        shard: AccountShard,
+        bot: str,
+        action: Callable[[], Awaitable[Any]],
+        predicate,
+        timeout: Optional[float] = None
+    ) -> Optional[Message]:
+        """Run action (a send, click or forward to bot) and return the reply
+        matching predicate, None on deadline
+        
+        Bot replies carry nothing that ties them to the message that caused
+        them, so one exchange at a time is in flight per (account, bot): the
+        lock is held until the reply arrives. Other bots and other accounts
+        proceed in parallel.
+        
+        A resolution nobody interactive is waiting for (a prefetch) raises
+        ResolutionPreempted instead of sending while interactive requests
+        are in flight; between exchanges no reply is outstanding, so it can
+        stop there even after earlier steps have messaged the bot.
+        """
+        async with self._lock(shard, bot):
+            after_id = shard.router.last_id(bot)
+            resolution = _current_resolution.get()
+            if resolution is not None:
+                if self.interactive_active > 0 and not self._interactive_resolutions.get(resolution):
+                    raise ResolutionPreempted(resolution)
+                self._sent_resolutions.add(resolution)
+            sent = await action()
+            if isinstance(sent, Message):
+                after_id = max(after_id, sent.id)
+            try:
+                return await shard.router.wait_for(bot, predicate, after_id, timeout=timeout or self.reply_timeout)
+            except asyncio.TimeoutError:
+                return None
     
-    async def _get_file_link_from_bot(self, file_reference: str) -> str:
+    async def _wait_for_reply(self, shard: AccountShard, after_id: int, predicate, timeout: Optional[float] = None) -> Optional[Message]:
+        """Wait for the next search bot message after after_id matching predicate, None on deadline"""
+        async with self._lock(shard, self.search_bot):
+            try:
+                return await shard.router.wait_for(
+                    self.search_bot, predicate, after_id, timeout=timeout or self.reply_timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+    
+    async def _send_and_wait_for_file(self, shard: AccountShard, text: str, timeout: Optional[float] = None) -> Optional[Message]:
+        """Send text to the search bot and wait for the file it answers with"""
+        return await self._exchange(
+            shard, self.search_bot, lambda: self._send(shard, self.search_bot, text), has_file, timeout
+        )
+    
+    async def _join_channels_from(self, shard: AccountShard, message: Message):
+        """Join every t.me channel linked from the message's buttons"""
+        if not getattr(message, 'buttons', None):
+            return
+        for button_row in message.buttons:
+            for btn in button_row:
+                if getattr(btn, 'url', None) and 't.me/' in btn.url:
+                    channel = btn.url.split('t.me/')[-1].split('?')[0]
+                    try:
+                        print(f"🔗 Joining channel: {channel}")
+                        entity = await shard.client.get_entity(channel)
+                        await shard.client(JoinChannelRequest(entity))
+                        print(f"✅ Joined {channel}")
+                    except Exception as e:
+                        print(f"⚠️ Could not join {channel}: {e}")
+    
+    async def _click_try_again(self, shard: AccountShard, message: Message, follow_start: bool = False) -> Optional[Message]:
+        """Click the message's "Try Again" button and wait for the file it unlocks
+        
+        With follow_start, a /start command sent back by the bot is executed too.
+        """
+        if not getattr(message, 'buttons', None):
+            return None
+        predicate = _file_or_start_command if follow_start else has_file
+        for button_row in message.buttons:
+            for btn in button_row:
+                if btn.text and "TRY AGAIN" in btn.text.upper():
+                    print("🔄 Clicking 'Try Again'...")
+                    try:
+                        reply = await self._exchange(
+                            shard, self.search_bot,
+                            lambda: self.rate_limiter.call(
+                                shard.name, self.search_bot, lambda: message.click(text=btn.text)
+                            ),
+                            predicate
+                        )
+                        if reply and not has_file(reply):
+                            print(f"📤 Found /start command, executing...")
+                            reply = await self._send_and_wait_for_file(shard, reply.text)
+                        return reply
+                    except Exception as e:
+                        print(f"⚠️ Try Again click failed: {e}")
+        return None
+    
+    async def _get_file_link_from_bot(self, shard: AccountShard, file_reference: str) -> str:
         """Get direct download link from File_Link_Generatorr_Bot"""
         print(f"🔗 Getting file link from @{self.file_link_bot}...")
         
         try:
-            # Send the file reference to the bot
-            await self.client.send_message(self.file_link_bot, file_reference)
-            print(f"📤 Sent file reference to link generator bot")
-            await asyncio.sleep(4)
-            
-            # Get bot's response
-            msgs = await self.client.get_messages(self.file_link_bot, limit=5)
-            
-            for msg in msgs:
-                if msg.text:
-                    print(f"📝 Bot response: {msg.text[:100]}...")
-                    # Look for URL in the response
-                    import re
-                    url_pattern = r'(https?://[^\s]+)'
-                    urls = re.findall(url_pattern, msg.text)
-                    if urls:
-                        link = urls[0]
-                        print(f"✅ Got direct link: {link}")
-                        return link
+            # Send the file reference to the bot and wait for its reply carrying a URL
+            print(f"📤 Sending file reference to link generator bot")
+            msg = await self._exchange(
+                shard, self.file_link_bot, lambda: self._send(shard, self.file_link_bot, file_reference),
+                has_url, timeout=self.link_timeout
+            )
+            if msg is None:
+                raise RuntimeError("File link bot did not return a URL")
             
-            raise RuntimeError("File link bot did not return a URL")
+            print(f"📝 Bot response: {msg.text[:100]}...")
+            link = extract_url(msg)
+            print(f"✅ Got direct link: {link}")
+            return link
             
         except Exception as e:
             print(f"❌ Failed to get file link: {e}")
             raise
     
-    async def _forward_and_get_url(self, message: Message) -> str:
+    async def _forward_and_get_url(self, shard: AccountShard, message: Message) -> str:
         """Forward message to File_Link_Generatorr_Bot, get link, and pass to RedMoon"""
         
         print("🎬 Processing file message...")
@@ -642,29 +851,31 @@ class TelegramService:
                 print(f"❌ Message is text only: {message.text[:200]}")
             raise RuntimeError("Message does not contain video or document")
         
+        # The same file reached through another result or quality resolves to the same link
+        doc_key = document_key(message.document.id) if message.document else None
+        if self.url_cache and doc_key:
+            cached_url = await asyncio.to_thread(self.url_cache.get, doc_key)
+            if cached_url:
+                print(f"✅ Returning cached link for document {message.document.id}")
+                return cached_url
+        
         try:
             # Step 1: Forward the file message to File_Link_Generatorr_Bot
+            # Step 2: Wait for the bot's reply with the direct download link
             print(f"📤 Step 1: Forwarding file to @{self.file_link_bot}...")
-            await self.client.forward_messages(self.file_link_bot, message)
-            print("✅ File forwarded successfully")
-            await asyncio.sleep(6)  # Wait for bot to process
-            
-            # Step 2: Get the direct download link from bot's response
-            print("📥 Step 2: Getting download link from bot...")
-            msgs = await self.client.get_messages(self.file_link_bot, limit=10)
-            
+            print("📥 Step 2: Waiting for download link from bot...")
+            msg = await self._exchange(
+                shard, self.file_link_bot,
+                lambda: self.rate_limiter.call(
+                    shard.name, self.file_link_bot, lambda: shard.client.forward_messages(self.file_link_bot, message)
+                ),
+                has_url, timeout=self.link_timeout
+            )
             direct_link = None
-            for msg in msgs:
-                if msg.text:
-                    print(f"📝 Bot response: {msg.text[:150]}...")
-                    # Look for direct download URL
-                    import re
-                    url_pattern = r'(https?://[^\s]+)'
-                    urls = re.findall(url_pattern, msg.text)
-                    if urls:
-                        direct_link = urls[0].strip()
-                        print(f"✅ Got direct download link: {direct_link}")
-                        break
+            if msg is not None:
+                print(f"📝 Bot response: {msg.text[:150]}...")
+                direct_link = extract_url(msg)
+                print(f"✅ Got direct download link: {direct_link}")
             
             if not direct_link:
                 print("⚠️ No link found in bot response")
@@ -684,20 +895,53 @@ class TelegramService:
             # For now, return the direct link since RedMoon proxy might not be configured
             # TODO: Set up RedMoon proxy endpoint
             print("⚠️ Returning direct link (RedMoon proxy not configured yet)")
+            if self.url_cache and doc_key:
+                await asyncio.to_thread(self.url_cache.put, [doc_key], direct_link)
             return direct_link
             
         except Exception as e:
             print(f"❌ Failed to get streaming link: {e}")
             # Return demo URL as fallback
-            demo_url = "https://commondatastorage.googleapis.com/gtv-videos-bucket/sample/BigBuckBunny.mp4"
-            print(f"⚠️ Using demo URL as fallback: {demo_url}")
-            return demo_url
+            print(f"⚠️ Using demo URL as fallback: {DEMO_STREAM_URL}")
+            return DEMO_STREAM_URL
+    
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Typeahead titles from local data only; never talks to Telegram"""
+        suggestions = self.suggest_index.lookup(prefix, limit)
+        if len(suggestions) < limit and self.catalog:
+            # Fall back to fuzzy catalog matches for typos
+            for item in self.catalog.lookup(prefix, limit=limit, min_score=0.5):
+                if item.title not in suggestions:
+                    suggestions.append(item.title)
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Search and reply-routing counters"""
+        return {
+            **self.stats,
+            "search_cache": self.search_cache.stats(),
+            "message_cache": self.message_cache.stats(),
+            "search_flight": self.search_flight.stats(),
+            "stream_flight": self.stream_flight.stats(),
+            "stream_url_cache": self.url_cache.stats() if self.url_cache else None,
+            "search_store": self.search_store.stats() if self.search_store else None,
+            "catalog": self.catalog.stats() if self.catalog else None,
+            "suggest_index": self.suggest_index.stats(),
+            "accounts": self.accounts.stats(),
+            "rate_limits": self.rate_limiter.stats(),
+        }
     
     def clear_cache(self):
         """Clear message and search cache"""
         self.message_cache.clear()
         self.search_cache.clear()
-        print("🗑️ Message and search cache cleared")
+        if self.url_cache:
+            self.url_cache.clear()
+        if self.search_store:
+            self.search_store.clear()
+        print("🗑️ Message, search and stream URL cache cleared")
 
 
 # Global telegram service instance (will be initialized in main.py)
@@ -22,9 +22,69 @@ STREAMING_BOT_USERNAME = os.getenv("STREAMING_BOT_USERNAME")
 # RedMoon Stream server URL
 REDMOON_STREAM_URL = os.getenv("REDMOON_STREAM_URL", "http://localhost:8000")
 
+# RedMoon streamer: memory budget for recently streamed 1 MiB chunks
+STREAM_CHUNK_CACHE_MB = int(os.getenv("STREAM_CHUNK_CACHE_MB", "256"))
+# ...and the on-disk tier below it (0 disables)
+STREAM_DISK_CACHE_DIR = os.getenv(
+    "STREAM_DISK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "chunks")
+)
+STREAM_DISK_CACHE_GB = float(os.getenv("STREAM_DISK_CACHE_GB", "20"))
+# Parallel chunk requests per stream (upper bound of the adaptive window) and upstream downloads in total
+STREAM_READAHEAD_WINDOW = int(os.getenv("STREAM_READAHEAD_WINDOW", "8"))
+STREAM_READAHEAD_INFLIGHT = int(os.getenv("STREAM_READAHEAD_INFLIGHT", "32"))
+
 # Domain for public streaming links
 DOMAIN = os.getenv("DOMAIN", "http://localhost:8000")
 
+# Directory for on-disk caches used by the FastAPI backend
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Resolved stream URLs: lifetime in seconds and maximum number of cached links
+STREAM_URL_CACHE_TTL = int(os.getenv("STREAM_URL_CACHE_TTL", "21600"))
+STREAM_URL_CACHE_MAX_ENTRIES = int(os.getenv("STREAM_URL_CACHE_MAX_ENTRIES", "5000"))
+
+# Search results: fresh window, then how long stale results are served while refreshing
+SEARCH_CACHE_FRESH_SECONDS = int(os.getenv("SEARCH_CACHE_FRESH_SECONDS", "300"))
+SEARCH_CACHE_STALE_SECONDS = int(os.getenv("SEARCH_CACHE_STALE_SECONDS", "86400"))
+# Queries kept in CACHE_DIR/search_results.db (least recently fetched dropped first)
+SEARCH_STORE_MAX_ENTRIES = int(os.getenv("SEARCH_STORE_MAX_ENTRIES", "5000"))
+
+# Local title catalog: serve matches seen within this many seconds (0 = index only) above this score
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", "0"))
+CATALOG_MIN_SCORE = float(os.getenv("CATALOG_MIN_SCORE", "0.75"))
+
+# Flask client pool: concurrent operations per Telegram session, queued callers and their wait limit
+TELEGRAM_SESSION_CONCURRENCY = int(os.getenv("TELEGRAM_SESSION_CONCURRENCY", "4"))
+TELEGRAM_SESSION_QUEUE_LIMIT = int(os.getenv("TELEGRAM_SESSION_QUEUE_LIMIT", "32"))
+TELEGRAM_QUEUE_TIMEOUT = float(os.getenv("TELEGRAM_QUEUE_TIMEOUT", "30"))
+
+# FastAPI backend user sessions (comma-separated .session names without extension);
+# work is spread across all authorized ones. Empty = admin_919353589504, else prosearch_single
+TELEGRAM_SESSIONS = [name.strip() for name in os.getenv("TELEGRAM_SESSIONS", "").split(",") if name.strip()]
+
+# Outgoing bot traffic per account and bot: starting rate (requests/second, adapted on FloodWait) and burst
+BOT_RATE_PER_SECOND = float(os.getenv("BOT_RATE_PER_SECOND", "1.0"))
+BOT_RATE_BURST = float(os.getenv("BOT_RATE_BURST", "3"))
+
+# Stream job scheduler (FastAPI backend)
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "4"))
+STREAM_QUEUE_LIMIT = int(os.getenv("STREAM_QUEUE_LIMIT", "100"))
+STREAM_JOB_DEADLINE = float(os.getenv("STREAM_JOB_DEADLINE", "120"))
+# Finished jobs are kept this long (seconds), and never more than JOB_MAX_COUNT jobs overall
+JOB_RETENTION_DONE_SECONDS = float(os.getenv("JOB_RETENTION_DONE_SECONDS", "3600"))
+JOB_RETENTION_FAILED_SECONDS = float(os.getenv("JOB_RETENTION_FAILED_SECONDS", "300"))
+JOB_MAX_COUNT = int(os.getenv("JOB_MAX_COUNT", "10000"))
+# A request for a stream that finished this recently (seconds) gets the same job back
+JOB_REUSE_SECONDS = int(os.getenv("JOB_REUSE_SECONDS", "600"))
+# Persist jobs to CACHE_DIR/jobs.db so they survive restarts
+JOB_STORE_ENABLED = os.getenv("JOB_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Speculative prefetch of stream links for the top search results (FastAPI backend)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "3"))
+PREFETCH_PER_MINUTE = float(os.getenv("PREFETCH_PER_MINUTE", "6"))
+
 # Validate required environment variables
 def validate_config():
     """Validate that all required environment variables are set"""
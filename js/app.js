@@ -83,11 +83,14 @@ class BBHCTheatre {
                 clearTimeout(this.searchTimeout);
             }
             
-            // Wait 500ms after user stops typing before searching
+            // Typing only fetches local suggestions; Enter or the button runs the real search
             this.searchTimeout = setTimeout(() => {
-                console.log('[BBHC] Search triggered after delay');
-                this.performSearch();
-            }, 500);
+                if (this.USE_BACKEND) {
+                    this.fetchSuggestions(this.searchQuery);
+                } else {
+                    this.performSearch();
+                }
+            }, 150);
         });
 
         searchBtn.addEventListener('click', () => {
@@ -239,6 +242,34 @@ class BBHCTheatre {
         }
     }
 
+    async fetchSuggestions(query) {
+        const datalist = document.getElementById('searchSuggestions');
+        if (!datalist) return;
+        
+        if (!query) {
+            datalist.innerHTML = '';
+            return;
+        }
+        
+        try {
+            const response = await fetch(`${this.API_BASE_URL}/api/suggest?q=${encodeURIComponent(query)}`);
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            // Ignore answers for text the user has already changed
+            if (data.query !== this.searchQuery) return;
+            
+            datalist.innerHTML = '';
+            data.suggestions.forEach(title => {
+                const option = document.createElement('option');
+                option.value = title;
+                datalist.appendChild(option);
+            });
+        } catch (error) {
+            console.warn('[BBHC] Suggestions unavailable:', error);
+        }
+    }
+
     async performBackendSearch(query) {
         try {
             this.showSkeletonLoaders();
@@ -517,8 +548,10 @@ class BBHCTheatre {
             
             console.log(`[BBHC] Stream job created: ${jobId}`);
             
-            // Poll for job completion
-            return await this.pollStreamJob(jobId);
+            // Wait for job completion (server push, polling as fallback), a little
+            // longer than the server's own deadline so it gets to report the outcome
+            const deadlineSeconds = data.deadline_seconds || 120;
+            return await this.waitForStreamJob(jobId, (deadlineSeconds + 15) * 1000);
             
         } catch (error) {
             console.error('[BBHC] Stream request failed:', error);
@@ -526,8 +559,67 @@ class BBHCTheatre {
         }
     }
     
-    async pollStreamJob(jobId) {
-        const maxAttempts = 60; // 60 seconds max
+    async waitForStreamJob(jobId, timeoutMs) {
+        if (!window.EventSource) {
+            return await this.pollStreamJob(jobId, timeoutMs);
+        }
+        
+        try {
+            return await this.watchStreamJob(jobId, timeoutMs);
+        } catch (error) {
+            if (!error.fallback) {
+                throw error;
+            }
+            console.warn('[BBHC] Job event stream unavailable, polling instead');
+            return await this.pollStreamJob(jobId, timeoutMs);
+        }
+    }
+    
+    showJobProgress(job) {
+        const playerLoading = document.getElementById('playerLoading');
+        playerLoading.innerHTML = `
+            <div class="spinner"></div>
+            <p>${job.progress || 'Processing...'}</p>
+        `;
+    }
+    
+    watchStreamJob(jobId, timeoutMs = 135000) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`${this.API_BASE_URL}/api/job/${jobId}/events`);
+            const timeout = setTimeout(() => {
+                source.close();
+                reject(new Error('Stream request timed out'));
+            }, timeoutMs);
+            
+            const finish = (callback, value) => {
+                clearTimeout(timeout);
+                source.close();
+                callback(value);
+            };
+            
+            source.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                this.showJobProgress(job);
+                
+                if (job.status === 'done' && job.stream_url) {
+                    console.log('[BBHC] Stream ready:', job.stream_url);
+                    finish(resolve, job.stream_url);
+                } else if (job.status === 'failed') {
+                    finish(reject, new Error(job.error || 'Stream job failed'));
+                }
+            };
+            
+            // Connection refused or dropped before the job finished
+            source.onerror = () => {
+                const error = new Error('Job event stream failed');
+                error.fallback = true;
+                finish(reject, error);
+            };
+        });
+    }
+    
+    async pollStreamJob(jobId, timeoutMs = 135000) {
+        const maxAttempts = Math.ceil(timeoutMs / 1000); // One poll per second
         let attempts = 0;
         
         while (attempts < maxAttempts) {
@@ -541,11 +633,7 @@ class BBHCTheatre {
                 const job = await response.json();
                 
                 // Update loading message with progress
-                const playerLoading = document.getElementById('playerLoading');
-                playerLoading.innerHTML = `
-                    <div class="spinner"></div>
-                    <p>${job.progress || 'Processing...'}</p>
-                `;
+                this.showJobProgress(job);
                 
                 if (job.status === 'done' && job.stream_url) {
                     console.log('[BBHC] Stream ready:', job.stream_url);
@@ -0,0 +1,95 @@
+"""
+Shared in-flight chunk downloads for the streamer
+
+When several viewers watch the same file, their range requests miss the
+caches for the same chunks at about the same time. ChunkBroadcast keeps one
+upstream fetch per (file_id, chunk_index) in flight; later requests for that
+chunk subscribe to it instead of starting their own, so upstream traffic per
+popular file stays roughly constant regardless of audience size. Only the
+upstream fetches take one of the max_inflight slots; subscribers don't.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+ChunkKey = Tuple[str, int]
+
+# fetch_chunk(file_id, chunk_index) -> chunk bytes, or None past the end of the file
+FetchChunk = Callable[[str, int], Awaitable[Optional[bytes]]]
+
+
+class ChunkBroadcast:
+    """One upstream fetch per chunk, fanned out to every concurrent subscriber"""
+
+    def __init__(self, fetch_chunk: FetchChunk, max_inflight: int = 32):
+        self.fetch_chunk = fetch_chunk
+        self.max_inflight = max_inflight
+        # Created on first use so it binds to the server's event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.downloading = 0  # Fetches holding a slot right now
+        self.bytes_fetched = 0
+        self._inflight: Dict[ChunkKey, asyncio.Task] = {}
+        self._subscribers: Dict[ChunkKey, int] = {}
+        self.fetches = 0
+        self.shared = 0  # Requests served by joining someone else's fetch
+        self.cancelled = 0  # Fetches dropped because every subscriber went away
+
+    async def _download(self, file_id: str, index: int) -> Optional[bytes]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        async with self._slots:
+            self.downloading += 1
+            try:
+                chunk = await self.fetch_chunk(file_id, index)
+            finally:
+                self.downloading -= 1
+        if chunk:
+            self.bytes_fetched += len(chunk)
+        return chunk
+
+    def _finished(self, key: ChunkKey, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._subscribers.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieve it so asyncio doesn't warn when nobody is left
+
+    async def fetch(self, file_id: str, index: int) -> Optional[bytes]:
+        key = (file_id, index)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._download(file_id, index))
+            task.add_done_callback(lambda t, key=key: self._finished(key, t))
+            self._inflight[key] = task
+            self._subscribers[key] = 0
+            self.fetches += 1
+        else:
+            self.shared += 1
+
+        self._subscribers[key] += 1
+        try:
+            # One subscriber leaving must not cancel the download for the others
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._subscribers[key] -= 1
+                if self._subscribers[key] == 0 and not task.done():
+                    # Forget it now: a request arriving before the task finishes
+                    # cancelling must start a fresh fetch, not join this one
+                    del self._inflight[key]
+                    del self._subscribers[key]
+                    task.cancel()
+                    self.cancelled += 1
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "downloading": self.downloading,
+            "max_inflight": self.max_inflight,
+            "files": len({file_id for file_id, _ in self._inflight}),
+            "subscribers": sum(self._subscribers.values()),
+            "fetches": self.fetches,
+            "shared": self.shared,
+            "cancelled": self.cancelled,
+            "bytes_fetched": self.bytes_fetched,
+        }
@@ -0,0 +1,119 @@
+"""
+In-memory chunk cache for the streamer
+
+Keeps recently streamed 1 MiB chunks keyed by (file_id, chunk_index) under a
+byte budget, so overlapping range requests and concurrent viewers of the same
+file are served without downloading the same chunks from Telegram again.
+"""
+
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+ChunkKey = Tuple[str, int]
+
+# fetch_run(file_id, first_chunk, chunk_count) -> async iterator of chunks
+FetchRun = Callable[[str, int, int], AsyncIterator[bytes]]
+
+
+class ChunkCache:
+    """Byte-budgeted LRU of (file_id, chunk_index) -> bytes"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._chunks: "OrderedDict[ChunkKey, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Bytes served from cache instead of Telegram
+        self.bytes_fetched = 0
+        self.upstream_calls = 0
+        self.evictions = 0
+
+    def get(self, file_id: str, index: int) -> Optional[bytes]:
+        chunk = self._chunks.get((file_id, index))
+        if chunk is None:
+            self.misses += 1
+            return None
+        self._chunks.move_to_end((file_id, index))
+        self.hits += 1
+        self.bytes_saved += len(chunk)
+        return chunk
+
+    def peek(self, file_id: str, index: int) -> Optional[bytes]:
+        """Cached chunk for a fetch already counted as a miss; doesn't touch the hit stats"""
+        chunk = self._chunks.get((file_id, index))
+        if chunk is not None:
+            self._chunks.move_to_end((file_id, index))
+            self.bytes_saved += len(chunk)
+        return chunk
+
+    def __contains__(self, key: ChunkKey) -> bool:
+        return key in self._chunks
+
+    def put(self, file_id: str, index: int, chunk: bytes):
+        if len(chunk) > self.max_bytes:
+            return
+        key = (file_id, index)
+        old = self._chunks.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._chunks[key] = chunk
+        self._bytes += len(chunk)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._chunks.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    async def stream(self, file_id: str, first: int, count: int, fetch_run: FetchRun) -> AsyncIterator[bytes]:
+        """Yield chunks first..first+count-1 in order
+
+        Cached chunks are served directly; each contiguous run of misses is
+        fetched with a single upstream call and cached on the way through.
+        """
+        index = first
+        end = first + count
+        while index < end:
+            chunk = self.get(file_id, index)
+            if chunk is not None:
+                yield chunk
+                index += 1
+                continue
+
+            run_end = index + 1
+            while run_end < end and (file_id, run_end) not in self._chunks:
+                run_end += 1
+            self.misses += run_end - index - 1
+
+            self.upstream_calls += 1
+            fetched = 0
+            upstream = fetch_run(file_id, index, run_end - index)
+            try:
+                async for chunk in upstream:
+                    self.put(file_id, index, chunk)
+                    self.bytes_fetched += len(chunk)
+                    fetched += 1
+                    index += 1
+                    yield chunk
+                    if index >= run_end:
+                        break
+            finally:
+                # Close it now rather than at garbage collection so its fetches stop
+                await upstream.aclose()
+            if not fetched or index < run_end:
+                # Upstream ended early: past the end of the file
+                return
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._chunks),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_fetched": self.bytes_fetched,
+            "upstream_calls": self.upstream_calls,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,365 @@
+"""
+On-disk chunk store for the streamer
+
+Second cache tier below ChunkCache. Each file_id gets a sparse data file the
+size of the video plus a bitmap of the 1 MiB chunks present in it; whole
+files are evicted least-recently-used once the byte budget is exceeded.
+Ranges that are fully on disk are served without copying through Python
+bytes: via the ASGI zero-copy send extension when the server offers it,
+otherwise as mmap-backed memoryviews.
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+FetchRun = Callable[[str, int, int], AsyncIterator[bytes]]
+
+# Largest file Telegram serves (premium uploads); bigger client-reported sizes are bogus
+MAX_FILE_SIZE = 4 * 1024 ** 3
+
+
+class _StoredFile:
+    __slots__ = ("file_id", "file_size", "bitmap", "stored_bytes", "base_path", "lock", "evicted")
+
+    def __init__(self, file_id: str, file_size: int, bitmap: bytearray, base_path: str):
+        self.file_id = file_id
+        self.file_size = file_size
+        self.bitmap = bitmap
+        self.stored_bytes = 0
+        self.base_path = base_path
+        self.lock = threading.Lock()  # Serializes writes to the data and meta files
+        self.evicted = False
+
+    @property
+    def data_path(self) -> str:
+        return self.base_path + ".data"
+
+    @property
+    def meta_path(self) -> str:
+        return self.base_path + ".json"
+
+    def has(self, index: int) -> bool:
+        byte = index >> 3
+        return byte < len(self.bitmap) and bool(self.bitmap[byte] & (1 << (index & 7)))
+
+    def mark(self, index: int):
+        self.bitmap[index >> 3] |= 1 << (index & 7)
+
+
+class DiskChunkStore:
+    """Size-bounded sparse-file chunk store with per-file LRU eviction
+
+    Reads and writes run in worker threads. `_lock` guards the index and byte
+    accounting and is never held during file I/O; each file's own lock guards
+    its data and meta files. Every stored copy gets its own file name, so a
+    file_id stored again after eviction never collides with the old files.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, chunk_size: int = 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._files: "OrderedDict[str, _StoredFile]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_written = 0
+        self.bytes_zero_copy = 0
+        self.bytes_mmap = 0
+        self.range_hits = 0
+        self.evictions = 0
+        self.resets = 0  # Entries replaced because a request named a different file size
+        self._lock = threading.Lock()
+        self._doomed = []  # Evicted files that couldn't be removed yet (open on Windows)
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _chunk_count(self, file_size: int) -> int:
+        return (file_size + self.chunk_size - 1) // self.chunk_size
+
+    def _chunk_length(self, entry: _StoredFile, index: int) -> int:
+        return max(0, min(self.chunk_size, entry.file_size - index * self.chunk_size))
+
+    def accepts(self, file_size: int) -> bool:
+        """Whether a file of this (client-reported) size may be stored at all
+
+        Larger than Telegram allows, or alone larger than the whole budget,
+        it is streamed without writing through.
+        """
+        return 0 < file_size <= min(MAX_FILE_SIZE, self.max_bytes)
+
+    def _load(self):
+        """Rebuild the index from bitmaps left by a previous run, oldest first"""
+        metas = []
+        names = set(os.listdir(self.directory))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith(".json"):
+                metas.append((os.path.getmtime(path), path))
+            elif name.endswith(".tmp") or (name.endswith(".data") and name[:-len(".data")] + ".json" not in names):
+                self._remove(path)  # Leftovers of an interrupted write or eviction
+        for _, path in sorted(metas):
+            base_path = path[:-len(".json")]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                entry = _StoredFile(meta["file_id"], meta["file_size"], bytearray.fromhex(meta["bitmap"]), base_path)
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            if not os.path.exists(entry.data_path) or not self.accepts(entry.file_size):
+                continue
+            previous = self._files.pop(entry.file_id, None)
+            if previous is not None:
+                self._bytes -= previous.stored_bytes
+                self._doomed += [previous.meta_path, previous.data_path]
+            entry.stored_bytes = sum(
+                self._chunk_length(entry, i) for i in range(self._chunk_count(entry.file_size)) if entry.has(i)
+            )
+            self._files[entry.file_id] = entry
+            self._bytes += entry.stored_bytes
+        self._doomed = [path for path in self._doomed if not self._remove(path)]
+        if self._files:
+            print(f"💾 Disk chunk store: {len(self._files)} files, {self._bytes / 2**30:.2f} GiB")
+
+    def _entry(self, file_id: str, file_size: int) -> Tuple[_StoredFile, List[_StoredFile]]:
+        """Entry to write file_id into, plus entries dropped to make it (caller holds _lock)"""
+        dropped = []
+        entry = self._files.get(file_id)
+        if entry is not None and entry.file_size != file_size:
+            # The size comes from the client; never extend a bitmap sized for another one
+            del self._files[file_id]
+            self._bytes -= entry.stored_bytes
+            self.resets += 1
+            dropped.append(entry)
+            entry = None
+        if entry is None:
+            digest = hashlib.sha1(file_id.encode()).hexdigest()[:20]
+            base_path = os.path.join(self.directory, f"{digest}-{uuid.uuid4().hex[:8]}")
+            bitmap = bytearray((self._chunk_count(file_size) + 7) // 8)
+            entry = self._files[file_id] = _StoredFile(file_id, file_size, bitmap, base_path)
+        return entry, dropped
+
+    def has(self, file_id: str, index: int) -> bool:
+        with self._lock:
+            entry = self._files.get(file_id)
+            return entry is not None and entry.has(index)
+
+    def read(self, file_id: str, index: int) -> Optional[bytes]:
+        """Load one stored chunk (blocking; call from a worker thread)"""
+        with self._lock:
+            entry = self._files.get(file_id)
+            if entry is None or not entry.has(index):
+                self.misses += 1
+                return None
+            self._files.move_to_end(file_id)
+        try:
+            with open(entry.data_path, "rb") as f:
+                f.seek(index * self.chunk_size)
+                chunk = f.read(self._chunk_length(entry, index))
+        except OSError:
+            chunk = b""  # Evicted meanwhile
+        with self._lock:
+            if not chunk:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return chunk
+
+    def write(self, file_id: str, file_size: int, index: int, chunk: bytes):
+        """Store one chunk (blocking; call from a worker thread)"""
+        if not self.accepts(file_size) or not 0 <= index < self._chunk_count(file_size):
+            return
+        with self._lock:
+            entry, dropped = self._entry(file_id, file_size)
+        self._discard(dropped)
+
+        with entry.lock:
+            # Viewers sharing one fetch all write it through; only the first one counts
+            if entry.evicted or entry.has(index):
+                return
+            mode = "r+b" if os.path.exists(entry.data_path) else "w+b"
+            with open(entry.data_path, mode) as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < file_size:
+                    f.truncate(file_size)  # Sparse where supported: unwritten chunks take no space
+                f.seek(index * self.chunk_size)
+                f.write(chunk)
+            entry.mark(index)
+            tmp_path = f"{entry.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"file_id": file_id, "file_size": file_size, "bitmap": entry.bitmap.hex()}, f)
+            os.replace(tmp_path, entry.meta_path)
+
+        with self._lock:
+            if self._files.get(file_id) is not entry:
+                return  # Evicted while we were writing; _discard removes its files
+            entry.stored_bytes += len(chunk)
+            self._bytes += len(chunk)
+            self.bytes_written += len(chunk)
+            self._files.move_to_end(file_id)
+            evicted = self._evict(keep=file_id)
+        self._discard(evicted)
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False  # Still open or mapped (Windows); retried on a later eviction
+        return True
+
+    def _evict(self, keep: str) -> List[_StoredFile]:
+        """Unlink least recently used files from the index until under budget
+        (caller holds _lock; pass the result to _discard once it is released)"""
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            file_id, entry = next(iter(self._files.items()))
+            if file_id == keep:
+                self._files.move_to_end(file_id)
+                continue
+            del self._files[file_id]
+            self._bytes -= entry.stored_bytes
+            self.evictions += 1
+            evicted.append(entry)
+        return evicted
+
+    def _discard(self, entries: List[_StoredFile]):
+        """Delete the files of entries already removed from the index"""
+        with self._lock:
+            failed, self._doomed = self._doomed, []
+        failed = [path for path in failed if not self._remove(path)]
+        for entry in entries:
+            with entry.lock:  # Waits for a write in progress
+                entry.evicted = True
+                # Meta first, so a failed data removal is cleaned up as an orphan on the next start
+                failed += [path for path in (entry.meta_path, entry.data_path) if not self._remove(path)]
+        if failed:
+            with self._lock:
+                self._doomed += failed
+
+    async def stream(self, file_id: str, file_size: int, first: int, count: int, fetch_run: FetchRun) -> AsyncIterator[bytes]:
+        """Yield chunks in order from disk, fetching each run of missing ones
+        with one upstream call and writing them through"""
+        index = first
+        end = first + count
+        while index < end:
+            chunk = await asyncio.to_thread(self.read, file_id, index)
+            if chunk is not None:
+                yield chunk
+                index += 1
+                continue
+
+            run_end = index + 1
+            while run_end < end and not self.has(file_id, run_end):
+                run_end += 1
+
+            fetched = 0
+            upstream = fetch_run(file_id, index, run_end - index)
+            try:
+                async for chunk in upstream:
+                    await asyncio.to_thread(self.write, file_id, file_size, index, chunk)
+                    fetched += 1
+                    index += 1
+                    yield chunk
+                    if index >= run_end:
+                        break
+            finally:
+                await upstream.aclose()
+            if not fetched or index < run_end:
+                return
+
+    def range_response(
+        self, file_id: str, file_size: int, start: int, end: int, status_code: int, headers: Dict[str, str]
+    ) -> Optional[Response]:
+        """Response serving start..end straight from disk, if the whole range is stored"""
+        with self._lock:
+            entry = self._files.get(file_id)
+            if entry is None or entry.file_size != file_size:
+                return None
+            if not all(entry.has(i) for i in range(start // self.chunk_size, end // self.chunk_size + 1)):
+                return None
+            self._files.move_to_end(file_id)
+            path = entry.data_path
+        # Open now: an eviction after this point can't pull the file from under the response
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        except OSError:
+            return None
+        self.range_hits += 1
+        return DiskRangeResponse(self, fd, start, end - start + 1, status_code, headers)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "chunk_hits": self.hits,
+            "chunk_misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "range_hits": self.range_hits,
+            "bytes_written": self.bytes_written,
+            "bytes_zero_copy": self.bytes_zero_copy,
+            "bytes_mmap": self.bytes_mmap,
+            "evictions": self.evictions,
+            "resets": self.resets,
+        }
+
+
+class DiskRangeResponse(Response):
+    """Sends a byte range of a stored data file without building Python bytes"""
+
+    def __init__(self, store: DiskChunkStore, fd: int, offset: int, count: int, status_code: int, headers: Dict[str, str]):
+        super().__init__(status_code=status_code, headers=headers)
+        self.store = store
+        self.fd = fd  # Owned by the response, closed once it has been sent
+        self.offset = offset
+        self.count = count
+
+    async def __call__(self, scope, receive, send):
+        fd = self.fd
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": fd,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+                self.store.bytes_zero_copy += self.count
+                return
+
+            # mmap offsets must be page aligned
+            aligned = self.offset - self.offset % mmap.ALLOCATIONGRANULARITY
+            skip = self.offset - aligned
+            mapped = mmap.mmap(fd, skip + self.count, access=mmap.ACCESS_READ, offset=aligned)
+            try:
+                view = memoryview(mapped)
+                position = skip
+                stop = skip + self.count
+                while position < stop:
+                    piece_end = min(stop, position + self.store.chunk_size)
+                    await send({"type": "http.response.body", "body": view[position:piece_end], "more_body": True})
+                    self.store.bytes_mmap += piece_end - position
+                    position = piece_end
+                del view
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # The server still references a slice; the mapping goes away with it
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
@@ -0,0 +1,111 @@
+"""
+Long-lived media sessions for chunk downloads
+
+Pyrogram's get_file/stream_media opens a fresh media Session for every call
+(a full auth key exchange plus Export/ImportAuthorization on a foreign DC)
+and holds the client-wide transmission semaphore while it runs. That is fine
+for one sequential download but defeats per-chunk read-ahead. This pool keeps
+media sessions open per DC and issues raw upload.GetFile calls on them, so
+many chunk requests can be in flight on the same connections.
+"""
+
+import asyncio
+import itertools
+from typing import Dict, List, Optional
+
+from pyrogram import Client, raw
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Auth, Session
+
+
+class UnsupportedLocation(Exception):
+    """The file can't be fetched with a plain GetFile (photo location or CDN redirect)"""
+
+
+class MediaSessionPool:
+    """Per-DC media sessions shared by every chunk download"""
+
+    def __init__(self, client: Client, chunk_size: int = 1024 * 1024, sessions_per_dc: int = 2):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.sessions_per_dc = max(1, sessions_per_dc)
+        self._sessions: Dict[int, List[Session]] = {}
+        self._starting: Dict[int, asyncio.Task] = {}
+        self._turn = itertools.count()
+        self.requests = 0
+        self.sessions_started = 0
+        self.unsupported = 0
+
+    async def _start_sessions(self, dc_id: int) -> List[Session]:
+        try:
+            home_dc = await self.client.storage.dc_id()
+            test_mode = await self.client.storage.test_mode()
+            sessions = []
+            for _ in range(self.sessions_per_dc):
+                if dc_id != home_dc:
+                    auth_key = await Auth(self.client, dc_id, test_mode).create()
+                else:
+                    auth_key = await self.client.storage.auth_key()
+                session = Session(self.client, dc_id, auth_key, test_mode, is_media=True)
+                await session.start()
+                if dc_id != home_dc:
+                    exported = await self.client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+                    await session.invoke(raw.functions.auth.ImportAuthorization(id=exported.id, bytes=exported.bytes))
+                sessions.append(session)
+                self.sessions_started += 1
+            self._sessions[dc_id] = sessions
+            print(f"📡 Opened {len(sessions)} media session(s) to DC {dc_id}")
+            return sessions
+        finally:
+            self._starting.pop(dc_id, None)
+
+    async def _session(self, dc_id: int) -> Session:
+        sessions = self._sessions.get(dc_id)
+        if sessions is None:
+            task = self._starting.get(dc_id)
+            if task is None:
+                task = asyncio.ensure_future(self._start_sessions(dc_id))
+                self._starting[dc_id] = task
+            # A viewer going away must not abort the handshake for everyone else
+            sessions = await asyncio.shield(task)
+        return sessions[next(self._turn) % len(sessions)]
+
+    async def get_chunk(self, file_id: str, index: int) -> Optional[bytes]:
+        """One chunk of a document, or None past the end of the file"""
+        decoded = FileId.decode(file_id)
+        if decoded.file_type in (FileType.PHOTO, FileType.CHAT_PHOTO, FileType.THUMBNAIL):
+            self.unsupported += 1
+            raise UnsupportedLocation(decoded.file_type)
+
+        location = raw.types.InputDocumentFileLocation(
+            id=decoded.media_id,
+            access_hash=decoded.access_hash,
+            file_reference=decoded.file_reference,
+            thumb_size=decoded.thumbnail_size
+        )
+        session = await self._session(decoded.dc_id)
+        self.requests += 1
+        r = await session.invoke(
+            raw.functions.upload.GetFile(location=location, offset=index * self.chunk_size, limit=self.chunk_size),
+            sleep_threshold=30
+        )
+        if not isinstance(r, raw.types.upload.File):
+            self.unsupported += 1
+            raise UnsupportedLocation("cdn redirect")
+        return r.bytes or None
+
+    async def stop(self):
+        for task in list(self._starting.values()):
+            task.cancel()
+        for sessions in self._sessions.values():
+            for session in sessions:
+                await session.stop()
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "dcs": sorted(self._sessions),
+            "sessions_started": self.sessions_started,
+            "requests": self.requests,
+            "unsupported": self.unsupported,
+        }
@@ -0,0 +1,101 @@
+"""
+Parallel read-ahead for the streamer
+
+A single stream_media iterator downloads one chunk per MTProto round trip.
+ReadAhead instead keeps a sliding window of single-chunk requests in flight
+and yields the results in order. The window grows while the consumer is
+waiting on Telegram and shrinks while finished chunks pile up unread, so fast
+clients get more parallelism and slow ones don't download far ahead.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+# fetch_chunk(file_id, chunk_index) -> chunk bytes, or None past the end of the file
+FetchChunk = Callable[[str, int], Awaitable[Optional[bytes]]]
+
+
+class ReadAhead:
+    """Windowed concurrent chunk fetcher with in-order delivery"""
+
+    def __init__(self, fetch_chunk: FetchChunk, max_window: int = 8, min_window: int = 2):
+        self.fetch_chunk = fetch_chunk
+        self.max_window = max(1, max_window)
+        self.min_window = max(1, min(min_window, self.max_window))
+        self.inflight = 0
+        self.active_streams = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.stalls = 0  # Consumer had to wait for the next chunk
+        self.window_grows = 0
+        self.window_shrinks = 0
+        self.aborted = 0  # Streams closed before all their chunks were read
+        self.wasted_bytes = 0  # Downloaded ahead for an aborted stream and never read
+
+    async def _fetch(self, file_id: str, index: int) -> Optional[bytes]:
+        self.inflight += 1
+        self.requests += 1
+        try:
+            chunk = await self.fetch_chunk(file_id, index)
+        finally:
+            self.inflight -= 1
+        if chunk:
+            self.bytes_fetched += len(chunk)
+        return chunk
+
+    async def stream(self, file_id: str, first: int, count: int) -> AsyncIterator[bytes]:
+        """Yield chunks first..first+count-1 in order, stopping early at the end of the file"""
+        end = first + count
+        window = self.min_window
+        pending: Dict[int, asyncio.Task] = {}
+        scheduled = first
+        finished = False
+        self.active_streams += 1
+        try:
+            for index in range(first, end):
+                while scheduled < end and scheduled - index < window:
+                    pending[scheduled] = asyncio.ensure_future(self._fetch(file_id, scheduled))
+                    scheduled += 1
+
+                task = pending.pop(index)
+                if not task.done():
+                    # Telegram is the bottleneck: widen the window
+                    self.stalls += 1
+                    if window < self.max_window:
+                        window += 1
+                        self.window_grows += 1
+                elif pending and all(t.done() for t in pending.values()) and window > self.min_window:
+                    # Everything ahead is already downloaded: the client is the bottleneck
+                    window -= 1
+                    self.window_shrinks += 1
+
+                chunk = await task
+                # Past the end of the file, or the last chunk requested: nothing is left to waste
+                finished = not chunk or index == end - 1
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            # Cancelling the rest releases upstream slots nobody else is waiting on
+            for task in pending.values():
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None and task.result():
+                    self.wasted_bytes += len(task.result())
+            if not finished:
+                self.aborted += 1
+            self.active_streams -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active_streams": self.active_streams,
+            "inflight": self.inflight,
+            "max_window": self.max_window,
+            "requests": self.requests,
+            "bytes_fetched": self.bytes_fetched,
+            "stalls": self.stalls,
+            "window_grows": self.window_grows,
+            "window_shrinks": self.window_shrinks,
+            "aborted": self.aborted,
+            "wasted_bytes": self.wasted_bytes,
+        }
@@ -66,7 +66,16 @@ import sys
 
 # Add parent directory to path to import shared config
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from config import TELEGRAM_BOT_TOKEN, API_ID, API_HASH, DOMAIN as CONFIG_DOMAIN
+from config import (
+    TELEGRAM_BOT_TOKEN, API_ID, API_HASH, DOMAIN as CONFIG_DOMAIN,
+    STREAM_CHUNK_CACHE_MB, STREAM_DISK_CACHE_DIR, STREAM_DISK_CACHE_GB,
+    STREAM_READAHEAD_WINDOW, STREAM_READAHEAD_INFLIGHT
+)
+from chunk_broadcast import ChunkBroadcast
+from chunk_cache import ChunkCache
+from disk_chunk_store import DiskChunkStore
+from media_sessions import MediaSessionPool, UnsupportedLocation
+from readahead import ReadAhead
 
 # Bot token from shared configuration
 TOKEN = TELEGRAM_BOT_TOKEN
@@ -95,6 +104,90 @@ CHUNK_SIZE = 1024 * 1024  # 1 MiB - aligned with Telegram's maximum chunk size
 
 _RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
 
+# Recently streamed chunks, shared by all range requests and viewers
+chunk_cache = ChunkCache(max_bytes=STREAM_CHUNK_CACHE_MB * 1024 * 1024)
+
+# Larger second tier on disk (disabled when STREAM_DISK_CACHE_GB is 0)
+disk_store = DiskChunkStore(
+    STREAM_DISK_CACHE_DIR,
+    max_bytes=int(STREAM_DISK_CACHE_GB * 1024 ** 3),
+    chunk_size=CHUNK_SIZE
+) if STREAM_DISK_CACHE_GB > 0 else None
+
+
+async def _stored_chunk(file_id: str, index: int) -> Optional[bytes]:
+    """Chunk already in the memory or disk tier, if any"""
+    chunk = chunk_cache.peek(file_id, index)
+    if chunk is None and disk_store is not None and disk_store.has(file_id, index):
+        chunk = await asyncio.to_thread(disk_store.read, file_id, index)
+    return chunk
+
+
+async def _fetch_chunk(file_id: str, index: int) -> Optional[bytes]:
+    """Upstream download of a single chunk on the shared media sessions"""
+    # Another viewer may have stored it while this fetch waited for a slot
+    chunk = await _stored_chunk(file_id, index)
+    if chunk is not None:
+        return chunk
+    try:
+        return await media_sessions.get_chunk(file_id, index)
+    except UnsupportedLocation:
+        pass
+
+    # CDN-redirected files still go through Pyrogram's own downloader
+    chunks = pyrogram_bot.stream_media(file_id, offset=index, limit=1)
+    try:
+        async for chunk in chunks:
+            return chunk
+    finally:
+        await chunks.aclose()
+    return None
+
+
+# Viewers of the same file share each in-flight chunk download
+# (only real downloads count against STREAM_READAHEAD_INFLIGHT)
+broadcast = ChunkBroadcast(_fetch_chunk, max_inflight=STREAM_READAHEAD_INFLIGHT)
+
+
+async def _read_ahead_chunk(file_id: str, index: int) -> Optional[bytes]:
+    """Chunk for the read-ahead window, from the caches if another viewer stored it
+    since the window was scheduled, otherwise from the shared upstream fetch"""
+    chunk = await _stored_chunk(file_id, index)
+    if chunk is None:
+        chunk = await broadcast.fetch(file_id, index)
+    return chunk
+
+
+# Several GetFile requests in flight per stream instead of one round trip per chunk
+readahead = ReadAhead(
+    _read_ahead_chunk,
+    max_window=STREAM_READAHEAD_WINDOW
+)
+
+
+def _fetch_run(file_id: str, first_chunk: int, chunk_count: int):
+    """Upstream download of consecutive chunks, read ahead in parallel"""
+    return readahead.stream(file_id, first_chunk, chunk_count)
+
+
+# Outcome of /stream responses that go through the chunk pipeline
+stream_counters = {
+    "requests": 0,
+    "completed": 0,
+    "aborted": 0,  # Client disconnected (seek, close) before the range was sent
+    "bytes_sent": 0,
+}
+
+
+def _tiered_fetch_run(file_size: int):
+    """Memory-cache miss handler: read through the disk tier when there is one"""
+    if disk_store is None or not disk_store.accepts(file_size):
+        return _fetch_run
+
+    def fetch_run(file_id: str, first_chunk: int, chunk_count: int):
+        return disk_store.stream(file_id, file_size, first_chunk, chunk_count, _fetch_run)
+    return fetch_run
+
 
 def _parse_range(range_header: str, file_size: int) -> Tuple[int, int]:
     match = _RANGE_RE.fullmatch(range_header.strip())
@@ -130,9 +223,14 @@ pyrogram_bot = Client(
     "video_streamer_bot",
     api_id=int(API_ID),
     api_hash=API_HASH,
-    bot_token=TOKEN
+    bot_token=TOKEN,
+    # get_file holds a semaphore of this size for each download (default 1)
+    max_concurrent_transmissions=STREAM_READAHEAD_INFLIGHT
 )
 
+# Media sessions kept open across chunk requests
+media_sessions = MediaSessionPool(pyrogram_bot, chunk_size=CHUNK_SIZE)
+
 
 # Lifespan for FastAPI to handle startup/shutdown
 @asynccontextmanager
@@ -148,7 +246,8 @@ async def lifespan(app: FastAPI):
         await polling_task
     except asyncio.CancelledError:
         pass
-    # Stop Pyrogram client
+    # Close media sessions, then stop Pyrogram client
+    await media_sessions.stop()
     await pyrogram_bot.stop()
 
 app = FastAPI(lifespan=lifespan)
@@ -222,30 +321,32 @@ async def stream_video(file_id: str, request: Request, size: int) -> StreamingRe
 
     # Pyrogram's stream_media is an async generator with optimized chunk streaming
     async def generate():
+        # Calculate chunk-based offset and limit for Pyrogram
+        # Pyrogram's offset is in chunks (1 MiB each), not bytes
+        start_chunk = start // CHUNK_SIZE
+        offset_in_chunk = start % CHUNK_SIZE
+
+        # Calculate how many chunks we need to stream
+        # Add 1 to handle partial chunks at the end
+        total_chunks_needed = (content_length + offset_in_chunk + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+        bytes_to_send = content_length
+        stream_counters["requests"] += 1
+
+        # Cached chunks are served from memory; each run of missing chunks is
+        # read ahead from Telegram in parallel
+        chunks = chunk_cache.stream(file_id, start_chunk, total_chunks_needed, _tiered_fetch_run(file_size))
         try:
-            # Calculate chunk-based offset and limit for Pyrogram
-            # Pyrogram's offset is in chunks (1 MiB each), not bytes
-            start_chunk = start // CHUNK_SIZE
-            offset_in_chunk = start % CHUNK_SIZE
-            
-            # Calculate how many chunks we need to stream
-            # Add 1 to handle partial chunks at the end
-            total_chunks_needed = (content_length + offset_in_chunk + CHUNK_SIZE - 1) // CHUNK_SIZE
-            
-            bytes_to_send = content_length
             is_first_chunk = True
 
-            # Use stream_media with offset and limit for optimal performance
-            # offset: skip chunks before the requested range
-            # limit: only fetch the chunks we need (reduces unnecessary data transfer)
-            async for chunk in pyrogram_bot.stream_media(
-                file_id, 
-                offset=start_chunk,
-                limit=total_chunks_needed
-            ):
+            async for chunk in chunks:
                 if bytes_to_send <= 0:
                     break
 
+                # Browsers drop range requests all the time when seeking
+                if await request.is_disconnected():
+                    break
+
                 # If this is the first chunk, apply the inner-chunk offset
                 if is_first_chunk and offset_in_chunk > 0:
                     chunk = chunk[offset_in_chunk:]
@@ -253,16 +354,24 @@ async def stream_video(file_id: str, request: Request, size: int) -> StreamingRe
 
                 # Ensure we don't send more bytes than requested
                 if len(chunk) > bytes_to_send:
-                    yield chunk[:bytes_to_send]
-                    break
+                    chunk = chunk[:bytes_to_send]
 
                 yield chunk
                 bytes_to_send -= len(chunk)
+                stream_counters["bytes_sent"] += len(chunk)
 
         except Exception as e:
             print(f"Error in generate: {e}")
             # This part of the code is running in a generator, so we can't raise HTTPException
             # The client will see a broken connection
+        finally:
+            # Runs on disconnect too (break, send failure or cancellation): closing the
+            # chunk pipeline cancels its read-ahead fetches instead of leaving them running
+            await chunks.aclose()
+            if bytes_to_send > 0:
+                stream_counters["aborted"] += 1
+            else:
+                stream_counters["completed"] += 1
 
     headers = {
         "Accept-Ranges": "bytes",
@@ -274,12 +383,33 @@ async def stream_video(file_id: str, request: Request, size: int) -> StreamingRe
     if status_code == 206:
         headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
 
+    # Ranges already on disk skip the chunk pipeline entirely
+    if disk_store is not None:
+        response = disk_store.range_response(file_id, file_size, start, end, status_code, headers)
+        if response is not None:
+            return response
+
     return StreamingResponse(
         generate(),
         status_code=status_code,
         headers=headers,
     )
 
+# Streaming cache statistics
+@app.get("/stats")
+async def stream_stats():
+    return {
+        "streams": {
+            **stream_counters,
+            "wasted_bytes": readahead.wasted_bytes,
+        },
+        "chunk_cache": chunk_cache.stats(),
+        "disk_store": disk_store.stats() if disk_store else None,
+        "readahead": readahead.stats(),
+        "broadcast": broadcast.stats(),
+        "media_sessions": media_sessions.stats(),
+    }
+
 if __name__ == "__main__":
     # Run FastAPI with uvicorn, which will also manage the bot's lifespan
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Telegram Client Pool
+Keeps long-lived Telethon clients connected on one background event loop
+so Flask handlers don't pay an MTProto handshake per HTTP request
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from telethon import TelegramClient
+from telethon.tl.functions import PingRequest
+
+T = TypeVar("T")
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when a session's admission queue is full or the wait timed out"""
+
+
+class SessionGate:
+    """Bounded admission for operations on one session: a semaphore plus a capped wait queue"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_waiting = 0
+
+    async def acquire(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PoolBusyError(f"Too many queued Telegram operations ({self.waiting} waiting)")
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise PoolBusyError(f"Timed out after {self.queue_timeout}s waiting for a Telegram slot")
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.admitted += 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class TelegramClientPool:
+    """Pool of connected Telethon clients keyed by session name"""
+
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        health_check_interval: float = 60.0,
+        idle_timeout: float = 1800.0,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0,
+    ):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.health_check_interval = health_check_interval
+        self.idle_timeout = idle_timeout
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+        # Only touched from the pool loop
+        self._clients: Dict[str, TelegramClient] = {}
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+        self._last_used: Dict[str, float] = {}
+        self._gates: Dict[str, SessionGate] = {}
+        self._resource_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.reconnects = 0
+
+    def start(self):
+        """Start the background event loop thread (idempotent)"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run_loop, name="telegram-pool", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start_health_checks(), self._loop).result()
+            atexit.register(self.shutdown)
+            print("✅ Telegram client pool started")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _start_health_checks(self):
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    def run(
+        self,
+        session_name: str,
+        operation: Callable[[TelegramClient], Awaitable[T]],
+        timeout: Optional[float] = None,
+    ) -> T:
+        """Run operation(client) on the pool loop and block until it finishes"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._execute(session_name, operation), self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Telegram operation on {session_name} timed out after {timeout}s")
+
+    async def _execute(self, session_name: str, operation: Callable[[TelegramClient], Awaitable[T]]) -> T:
+        gate = self._gates.get(session_name)
+        if gate is None:
+            gate = self._gates[session_name] = SessionGate(self.max_concurrency, self.max_queue, self.queue_timeout)
+
+        await gate.acquire()
+        try:
+            client = await self.get_client(session_name)
+            self._last_used[session_name] = time.monotonic()
+            return await operation(client)
+        finally:
+            # Idle time counts from the end of the last operation, not its start
+            self._last_used[session_name] = time.monotonic()
+            gate.release()
+
+    @asynccontextmanager
+    async def resource_lock(self, session_name: str, resource: str) -> AsyncIterator[None]:
+        """Hold the lock for work that must not interleave on one session, e.g. a
+        conversation with one bot; raises PoolBusyError after queue_timeout"""
+        key = (session_name, resource)
+        lock = self._resource_locks.get(key)
+        if lock is None:
+            lock = self._resource_locks[key] = asyncio.Lock()
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PoolBusyError(f"Timed out after {self.queue_timeout}s waiting for {resource} on {session_name}")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def stats(self) -> dict:
+        """Per-session concurrency metrics (safe to call from any thread)"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "connected_clients": sum(1 for c in list(self._clients.values()) if c.is_connected()),
+            "reconnects": self.reconnects,
+            "sessions": {name: gate.stats() for name, gate in list(self._gates.items())},
+        }
+
+    async def get_client(self, session_name: str) -> TelegramClient:
+        """Return a connected client for session_name, creating or reconnecting it if needed"""
+        lock = self._connect_locks.setdefault(session_name, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(session_name)
+            if client is None:
+                client = TelegramClient(session_name, self.api_id, self.api_hash)
+                self._clients[session_name] = client
+                print(f"🔌 Pool: opening client for {session_name}")
+
+            if not client.is_connected():
+                await self._connect(client)
+            return client
+
+    async def _connect(self, client: TelegramClient, attempts: int = 3):
+        last_err: Optional[Exception] = None
+        for attempt in range(attempts):
+            try:
+                await client.connect()
+                if client.is_connected():
+                    return
+            except (ConnectionError, OSError) as e:
+                last_err = e
+            await asyncio.sleep(0.5 * (attempt + 1))
+        raise ConnectionError(f"Could not connect to Telegram: {last_err}")
+
+    async def _health_loop(self):
+        """Ping connected clients, reconnect dropped ones and close idle ones"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            now = time.monotonic()
+            for session_name, client in list(self._clients.items()):
+                gate = self._gates.get(session_name)
+                in_use = gate is not None and gate.active > 0
+                if not in_use and now - self._last_used.get(session_name, now) > self.idle_timeout:
+                    await self.discard(session_name)
+                    continue
+                try:
+                    if client.is_connected():
+                        await asyncio.wait_for(client(PingRequest(ping_id=random.getrandbits(63))), timeout=10)
+                        continue
+                except Exception as e:
+                    print(f"⚠️ Pool: health check failed for {session_name}: {e}")
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+                try:
+                    async with self._connect_locks.setdefault(session_name, asyncio.Lock()):
+                        await self._connect(client)
+                    self.reconnects += 1
+                    print(f"🔄 Pool: reconnected {session_name}")
+                except Exception as e:
+                    print(f"❌ Pool: reconnect failed for {session_name}: {e}")
+
+    async def discard(self, session_name: str):
+        """Disconnect and drop a pooled client"""
+        client = self._clients.pop(session_name, None)
+        self._last_used.pop(session_name, None)
+        if client and client.is_connected():
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+        print(f"🗑️ Pool: closed client for {session_name}")
+
+    async def _close_all(self):
+        if self._health_task:
+            self._health_task.cancel()
+        for session_name in list(self._clients):
+            await self.discard(session_name)
+
+    def shutdown(self):
+        """Disconnect every client and stop the loop thread"""
+        if not self._thread or not self._thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)